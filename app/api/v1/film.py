@@ -1,23 +1,36 @@
 import enum
 from http import HTTPStatus
-from typing import List, Optional
+from typing import Dict, List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pydantic import UUID4, BaseModel
 
 from core.auth import get_current_user
 from core.authorization import AuthorizedUser, is_adult_user
+from core.etag import ETAG_HEADER
+from core.models import model_fields
+from core.pagination import set_next_cursor
+from core.responses import TrustedJSONResponse
+from db.base import DEFAULT_SUGGEST_SIZE, MAX_SUGGEST_SIZE
 from services.film import FilmService, get_film_service
 
 router = APIRouter()
 
+# Максимальное количество id в одном запросе /batch/
+FILM_BATCH_MAX_SIZE = 100
+
 
 class FilmOrderingEnum(enum.Enum):
     imdb_rating__asc = "imdb_rating"
     imdb_rating__desc = "-imdb_rating"
 
 
+class FilmworkTypeEnum(enum.Enum):
+    movie = "movie"
+    tv_show = "tv_show"
+
+
 class PersonModel(BaseModel):
     id: UUID4
     full_name: str
@@ -45,6 +58,34 @@ class FilmListModel(BaseModel):
     imdb_rating: Optional[float]
 
 
+class GenreFacetModel(BaseModel):
+    id: UUID4
+    name: str
+    count: int
+
+
+class RatingFacetModel(BaseModel):
+    gte: float
+    lt: float
+    count: int
+
+
+class FilmworkTypeFacetModel(BaseModel):
+    type: str
+    count: int
+
+
+class FilmFacetsModel(BaseModel):
+    genres: List[GenreFacetModel]
+    imdb_rating: List[RatingFacetModel]
+    filmwork_type: List[FilmworkTypeFacetModel]
+
+
+class FilmSuggestModel(BaseModel):
+    id: UUID4
+    title: str
+
+
 @router.get(
     "/{film_id:uuid}/",
     response_model=FilmDetailsModel,
@@ -55,21 +96,39 @@ async def film_details(
     film_service: FilmService = Depends(get_film_service),
     current_user=Depends(get_current_user),
     adult_user=Depends(is_adult_user),
-) -> FilmDetailsModel:
-    film = await film_service.get_by_id(film_id)
-    if not film:
+) -> Response:
+    res = await film_service.get_with_etag(film_id, fields=model_fields(FilmDetailsModel))
+    if res is None:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="film not found")
 
-    return FilmDetailsModel(
-        id=film.id,
-        title=film.title,
-        imdb_rating=film.imdb_rating,
-        description=film.description,
-        genres=film.genres,
-        actors=film.actors,
-        writers=film.writers,
-        directors=film.directors,
-    )
+    film, etag = res
+    headers = {ETAG_HEADER: etag} if etag is not None else None
+    return TrustedJSONResponse(film, headers=headers)
+
+
+def film_filters(
+    filter_genre_ids: List[UUID] = Query(None, alias="filter[genre]"),
+    filter_actor_ids: List[UUID] = Query(None, alias="filter[actor]"),
+    filter_director_ids: List[UUID] = Query(None, alias="filter[director]"),
+    filter_writer_ids: List[UUID] = Query(None, alias="filter[writer]"),
+    filter_person_ids: List[UUID] = Query(None, alias="filter[person]"),
+    filter_types: List[FilmworkTypeEnum] = Query(None, alias="filter[type]"),
+    filter_rating_gte: float = Query(None, ge=0, le=10, alias="filter[imdb_rating][gte]"),
+    filter_rating_lte: float = Query(None, ge=0, le=10, alias="filter[imdb_rating][lte]"),
+) -> Dict:
+    """Фильтры списка фильмов, общие для списка и фасетов"""
+    # Повторяющийся параметр фильтра означает любое из значений, разные фильтры объединяются через И
+    filter_map = {
+        "genre_id": filter_genre_ids,
+        "actor_id": filter_actor_ids,
+        "director_id": filter_director_ids,
+        "writer_id": filter_writer_ids,
+        "person_ids": filter_person_ids,
+        "filmwork_type": [item.value for item in filter_types or []],
+        "imdb_rating_gte": filter_rating_gte,
+        "imdb_rating_lte": filter_rating_lte,
+    }
+    return {key: value for key, value in filter_map.items() if value or value == 0}
 
 
 @router.get(
@@ -81,25 +140,41 @@ async def film_list(
     sort: FilmOrderingEnum = Query(default=FilmOrderingEnum.imdb_rating__desc),
     page_number: int = Query(default=1, ge=1, alias="page[number]"),
     page_size: int = Query(default=50, ge=1, alias="page[size]"),
-    filter_genre_id: UUID = Query(None, alias="filter[genre]"),
+    filter_map: Dict = Depends(film_filters),
+    page_cursor: Optional[str] = Query(None, alias="page[cursor]"),
     film_service: FilmService = Depends(get_film_service),
     current_user=Depends(get_current_user),
     adult_user=Depends(is_adult_user),
-):
+) -> TrustedJSONResponse:
     sort_value, sort_order = sort.name.split("__")
 
-    filter_map = {}
-    if filter_genre_id:
-        filter_map["genre_id"] = filter_genre_id
-
-    films_list = await film_service.get_page(
+    films_list, next_cursor = await film_service.get_page(
         filter_map=filter_map,
         page_number=page_number,
         page_size=page_size,
         sort_value=sort_value,
         sort_order=sort_order,
+        cursor=page_cursor,
     )
-    return films_list
+    response = TrustedJSONResponse(films_list, fields=model_fields(FilmListModel))
+    set_next_cursor(response, next_cursor)
+    return response
+
+
+@router.get(
+    "/facets/",
+    response_model=FilmFacetsModel,
+    dependencies=[Depends(AuthorizedUser("movies_get_film_list"))],
+)
+async def film_facets(
+    filter_map: Dict = Depends(film_filters),
+    film_service: FilmService = Depends(get_film_service),
+    current_user=Depends(get_current_user),
+    adult_user=Depends(is_adult_user),
+) -> TrustedJSONResponse:
+    """Количество фильмов по жанрам, рейтингу и типам для фильтров списка фильмов"""
+    facets = await film_service.get_facets(filter_map)
+    return TrustedJSONResponse(facets)
 
 
 @router.get(
@@ -111,9 +186,46 @@ async def film_search(
     page: Optional[int] = 1,
     size: Optional[int] = 50,
     query: Optional[str] = "",
+    cursor: Optional[str] = None,
     film_service: FilmService = Depends(get_film_service),
     current_user=Depends(get_current_user),
     adult_user=Depends(is_adult_user),
-) -> List[FilmListModel]:
-    films = await film_service.search(page=page, size=size, match_obj=query)
-    return [FilmListModel(**film) for film in films]
+) -> TrustedJSONResponse:
+    films, next_cursor = await film_service.search(
+        page=page, size=size, match_obj=query, cursor=cursor
+    )
+    response = TrustedJSONResponse(films, fields=model_fields(FilmListModel))
+    set_next_cursor(response, next_cursor)
+    return response
+
+
+@router.get(
+    "/batch/",
+    response_model=List[Optional[FilmDetailsModel]],
+    dependencies=[Depends(AuthorizedUser("movies_get_film"))],
+)
+async def film_batch(
+    film_ids: List[UUID] = Query(..., alias="id", max_items=FILM_BATCH_MAX_SIZE),
+    film_service: FilmService = Depends(get_film_service),
+    current_user=Depends(get_current_user),
+    adult_user=Depends(is_adult_user),
+) -> TrustedJSONResponse:
+    """Фильмы по списку id (?id=...&id=...) в порядке запроса, null для ненайденных"""
+    films = await film_service.get_many(film_ids)
+    return TrustedJSONResponse(films, fields=model_fields(FilmDetailsModel))
+
+
+@router.get(
+    "/suggest/",
+    response_model=List[FilmSuggestModel],
+    dependencies=[Depends(AuthorizedUser("movies_search_film"))],
+)
+async def film_suggest(
+    query: str = Query(..., min_length=1, max_length=100),
+    size: int = Query(default=DEFAULT_SUGGEST_SIZE, ge=1, le=MAX_SUGGEST_SIZE),
+    film_service: FilmService = Depends(get_film_service),
+    current_user=Depends(get_current_user),
+) -> TrustedJSONResponse:
+    """Подсказки названий фильмов при вводе поискового запроса"""
+    films = await film_service.suggest(prefix=query, size=size)
+    return TrustedJSONResponse(films, fields=model_fields(FilmSuggestModel))
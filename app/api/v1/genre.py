@@ -3,11 +3,13 @@ from http import HTTPStatus
 from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from pydantic import UUID4, BaseModel
 
 from core.auth import get_current_user
 from core.authorization import AuthorizedUser
+from core.etag import ETAG_HEADER
+from core.pagination import set_next_cursor
 from services.genre import GenreService, get_genre_service
 
 router = APIRouter()
@@ -36,12 +38,17 @@ class SortFields(Enum):
 )
 async def genre_details(
     genre_id: UUID,
+    response: Response,
     genre_service: GenreService = Depends(get_genre_service),
     current_user=Depends(get_current_user),
 ) -> Genre:
-    genre = await genre_service.get_by_id(genre_id)
-    if not genre:
+    res = await genre_service.get_with_etag(genre_id)
+    if res is None:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="genre not found")
+
+    genre, etag = res
+    if etag is not None:
+        response.headers[ETAG_HEADER] = etag
     return Genre(id=genre.id, name=genre.name)
 
 
@@ -49,14 +56,17 @@ async def genre_details(
     "/", response_model=List[Genre], dependencies=[Depends(AuthorizedUser("movies_get_genre_list"))]
 )
 async def genre_list(
+    response: Response,
     page: Optional[int] = 1,
     size: Optional[int] = 50,
     sort: Optional[SortFields] = SortFields.name__asc,
+    cursor: Optional[str] = None,
     genre_service: GenreService = Depends(get_genre_service),
     current_user=Depends(get_current_user),
 ) -> List[Genre]:
     sort_value, sort_order = sort.name.split("__")
-    genres = await genre_service.get_genres_list(
-        page=page, size=size, sort_value=sort_value, sort_order=sort_order
+    genres, next_cursor = await genre_service.get_genres_list(
+        page=page, size=size, sort_value=sort_value, sort_order=sort_order, cursor=cursor
     )
+    set_next_cursor(response, next_cursor)
     return [Genre(id=genre.id, name=genre.name) for genre in genres]
@@ -3,11 +3,15 @@ from http import HTTPStatus
 from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pydantic import UUID4, BaseModel
 
 from core.auth import get_current_user
 from core.authorization import AuthorizedUser
+from core.models import model_fields
+from core.pagination import set_next_cursor
+from core.responses import TrustedJSONResponse
+from db.base import DEFAULT_SUGGEST_SIZE, MAX_SUGGEST_SIZE
 from services.person import PersonService, get_person_service
 
 router = APIRouter()
@@ -30,6 +34,13 @@ class Person(BaseModel):
     film_ids: List[UUID4]
 
 
+class PersonSuggest(BaseModel):
+    """Модель ответа для подсказок персон."""
+
+    id: UUID4
+    full_name: str
+
+
 class PersonFilm(BaseModel):
     """Модель ответа для фильмов в которых учавствовала персона."""
 
@@ -75,15 +86,18 @@ async def person_film_list(
     dependencies=[Depends(AuthorizedUser("movies_search_person"))],
 )
 async def person_search(
+    response: Response,
     page: Optional[int] = 1,
     size: Optional[int] = 50,
     query: Optional[str] = "",
+    cursor: Optional[str] = None,
     person_service: PersonService = Depends(get_person_service),
     current_user=Depends(get_current_user),
 ) -> List[Person]:
-    persons_full_data = await person_service.search_person_by_full_name(
-        page=page, size=size, match_obj=query
+    persons_full_data, next_cursor = await person_service.search_person_by_full_name(
+        page=page, size=size, match_obj=query, cursor=cursor
     )
+    set_next_cursor(response, next_cursor)
     persons = []
     for person_full_data in persons_full_data:
         person, person_roles, film_ids = person_full_data
@@ -91,3 +105,19 @@ async def person_search(
             Person(id=person.id, full_name=person.full_name, roles=person_roles, film_ids=film_ids)
         )
     return persons
+
+
+@router.get(
+    "/suggest/",
+    response_model=List[PersonSuggest],
+    dependencies=[Depends(AuthorizedUser("movies_search_person"))],
+)
+async def person_suggest(
+    query: str = Query(..., min_length=1, max_length=100),
+    size: int = Query(default=DEFAULT_SUGGEST_SIZE, ge=1, le=MAX_SUGGEST_SIZE),
+    person_service: PersonService = Depends(get_person_service),
+    current_user=Depends(get_current_user),
+) -> TrustedJSONResponse:
+    """Подсказки имен персон при вводе поискового запроса"""
+    persons = await person_service.suggest(prefix=query, size=size)
+    return TrustedJSONResponse(persons, fields=model_fields(PersonSuggest))
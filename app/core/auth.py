@@ -1,37 +1,208 @@
+import asyncio
+import hashlib
+import json
 import logging
-from typing import Optional
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
 
 import httpx
-from fastapi import Depends, HTTPException, status
+import jwt
+from aioredis import Redis, RedisError
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import APIKeyHeader
 from httpx import HTTPError
 from pydantic import UUID4
 
+from core import config
 from core.models import BaseModel
 
 logger = logging.getLogger(__name__)
 
 
+class InvalidTokenError(Exception):
+    """Токен не прошел проверку: неверная подпись, истек срок действия или отозван"""
+
+
+class TokenVerifierUnavailable(Exception):
+    """Локальная проверка токена невозможна, например недоступен redis"""
+
+
 class AuthClient:
-    def __init__(self, base_url):
+    """
+    Клиент сервиса аутентификации.
+    Держит один пул соединений на все время работы сервера,
+    поэтому соединения переиспользуются между запросами (keep-alive).
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 5.0,
+        timeout: float = 5.0,
+        connect_timeout: float = 1.0,
+        http2: bool = False,
+    ):
         self.base_url = base_url
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            http2=http2,
+        )
 
     async def check_token(self, token):
-        async with httpx.AsyncClient(base_url=self.base_url) as client:
-            return await client.post("/staff/api/v1/auth/check_token/", json={"token": token})
+        return await self.client.post("/staff/api/v1/auth/check_token/", json={"token": token})
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class LocalTokenVerifier:
+    """
+    Проверка access токена внутри сервиса без запроса к сервису аутентификации.
+    Проверяется подпись, срок действия и обязательные поля jwt,
+    а также наличие токена в списке отозванных, который ведет TokenService в redis.
+    """
+
+    algorithms = ["HS256"]
+    required_claims = ["exp", "iat", "user_id", "user_roles", "user_permissions", "country"]
+
+    def __init__(self, secret_key: str, redis: Redis):
+        self.secret_key = secret_key
+        self.redis = redis
+
+    async def verify(self, token: str) -> Dict:
+        """
+        Возвращает данные пользователя в том же формате, что и check_token сервиса аутентификации
+
+        :raises InvalidTokenError: Если токен не прошел проверку
+        :raises TokenVerifierUnavailable: Если не удалось проверить, отозван ли токен
+        """
+        try:
+            payload = jwt.decode(
+                token,
+                key=self.secret_key,
+                algorithms=self.algorithms,
+                options={"require": self.required_claims},
+            )
+        except jwt.PyJWTError as exc:
+            raise InvalidTokenError(str(exc)) from exc
+
+        try:
+            is_revoked = await self.redis.exists(token)
+        except (RedisError, OSError) as exc:
+            raise TokenVerifierUnavailable(repr(exc)) from exc
+
+        if is_revoked:
+            raise InvalidTokenError("Access token was revoked")
+
+        return {
+            "user_id": payload["user_id"],
+            "user_roles": json.loads(payload["user_roles"]),
+            "user_permissions": json.loads(payload["user_permissions"]),
+            "country": payload["country"],
+            "birthdate": payload.get("birthdate"),
+        }
+
+
+class TokenCache:
+    """
+    LRU кеш результатов проверки токена с ограниченным временем жизни.
+    Ключом служит хеш токена, запись живет не дольше ttl и не дольше срока действия токена.
+    Одновременные промахи по одному токену объединяются в один запрос к сервису аутентификации.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def make_key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    async def get_or_fetch(self, token: str, fetch: Callable[[], Awaitable[Dict]]) -> Dict:
+        key = self.make_key(token)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, data = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            del self._entries[key]
+
+        self.misses += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, token, fetch))
+            self._inflight[key] = task
+
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str, token: str, fetch: Callable[[], Awaitable[Dict]]) -> Dict:
+        try:
+            data = await fetch()
+        finally:
+            self._inflight.pop(key, None)
+
+        expires_at = time.time() + self.ttl
+        token_exp = self._get_token_exp(token)
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+
+        self._entries[key] = (expires_at, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+        return data
+
+    @staticmethod
+    def _get_token_exp(token: str) -> Optional[float]:
+        """Срок действия токена без проверки подписи, подпись проверяет сервис аутентификации"""
+        try:
+            payload = jwt.decode(token, options={"verify_signature": False})
+        except jwt.PyJWTError:
+            return None
+        return payload.get("exp")
+
+    def stats(self) -> Dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
 
 
 auth_client: AuthClient = None
+token_verifier: Optional[LocalTokenVerifier] = None
+token_cache: Optional[TokenCache] = None
 
 
 def get_auth_client() -> AuthClient:
     return auth_client
 
 
+def get_token_verifier() -> Optional[LocalTokenVerifier]:
+    return token_verifier
+
+
+def get_token_cache() -> Optional[TokenCache]:
+    return token_cache
+
+
 class User(BaseModel):
     user_id: UUID4
-    first_name: str
-    last_name: str
+    first_name: Optional[str]
+    last_name: Optional[str]
     birthdate: Optional[str]
     country: str
     user_roles: list
@@ -42,23 +213,55 @@ api_token_scheme = APIKeyHeader(name="TOKEN")
 
 
 async def get_current_user(
-    token: str = Depends(api_token_scheme), auth_client: AuthClient = Depends(get_auth_client)
-):
+    request: Request,
+    token: str = Depends(api_token_scheme),
+    auth_client: AuthClient = Depends(get_auth_client),
+    token_verifier: Optional[LocalTokenVerifier] = Depends(get_token_verifier),
+    token_cache: Optional[TokenCache] = Depends(get_token_cache),
+) -> User:
+    """
+    Пользователь текущего запроса.
+    Вычисляется один раз за запрос и сохраняется в request.state,
+    все проверки прав работают уже с сохраненным пользователем.
+    """
+    user = getattr(request.state, "user", None)
+    if user is None:
+        user = await resolve_user(token, auth_client, token_verifier, token_cache)
+        request.state.user = user
+    return user
+
+
+async def resolve_user(
+    token: str,
+    auth_client: AuthClient,
+    token_verifier: Optional[LocalTokenVerifier],
+    token_cache: Optional[TokenCache],
+) -> User:
+    """Проверка access токена и получение данных пользователя"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate access token",
     )
 
-    try:
-        response = await auth_client.check_token(token)
-    except HTTPError as exc:
-        logger.error(f"Auth request failed: {exc!r}")
-        raise credentials_exception
+    data = None
+    if token_verifier is not None:
+        try:
+            data = await token_verifier.verify(token)
+        except InvalidTokenError as exc:
+            logger.debug(f"Access token rejected: {exc}")
+            raise credentials_exception
+        except TokenVerifierUnavailable as exc:
+            logger.error(f"Local token verification failed: {exc}")
+            if not config.AUTH_REMOTE_FALLBACK:
+                raise credentials_exception
 
-    if response.status_code != status.HTTP_200_OK:
-        raise credentials_exception
-
-    data = response.json()
+    if data is None:
+        if token_cache is not None:
+            data = await token_cache.get_or_fetch(
+                token, lambda: check_token_remote(token, auth_client, credentials_exception)
+            )
+        else:
+            data = await check_token_remote(token, auth_client, credentials_exception)
 
     return User(
         user_id=data["user_id"],
@@ -66,6 +269,22 @@ async def get_current_user(
         user_permissions=data["user_permissions"],
         country=data["country"],
         birthdate=data["birthdate"],
-        first_name=data["first_name"],
-        last_name=data["last_name"],
+        first_name=data.get("first_name"),
+        last_name=data.get("last_name"),
     )
+
+
+async def check_token_remote(
+    token: str, auth_client: AuthClient, credentials_exception: HTTPException
+) -> Dict:
+    """Проверка токена запросом к сервису аутентификации"""
+    try:
+        response = await auth_client.check_token(token)
+    except HTTPError as exc:
+        logger.error(f"Auth request failed: {exc!r}")
+        raise credentials_exception
+
+    if response.status_code != status.HTTP_200_OK:
+        raise credentials_exception
+
+    return response.json()
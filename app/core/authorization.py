@@ -1,29 +1,50 @@
 from datetime import date
+from typing import Optional
 
 from fastapi import Depends, HTTPException
 from starlette import status
 
-from core.auth import get_current_user
+from core.auth import User, get_current_user
 
 from .enums import AdultAgeCountry
 
+# Возраст совершеннолетия для стран, которых нет в AdultAgeCountry
+DEFAULT_ADULT_AGE = 18
+
+
+def has_permission(user: User, permission_name: str) -> bool:
+    """Есть ли у пользователя право permission_name"""
+    return permission_name in user.user_permissions
+
+
+def is_adult(user: User, today: Optional[date] = None) -> bool:
+    """Является ли пользователь совершеннолетним в своей стране"""
+    if not user.birthdate:
+        return False
+
+    today = today or date.today()
+    birthdate = date.fromisoformat(user.birthdate[:10])
+    age = (
+        today.year - birthdate.year - ((today.month, today.day) < (birthdate.month, birthdate.day))
+    )
+
+    adult_age = AdultAgeCountry.__members__.get(user.country)
+    return age >= (adult_age.value if adult_age else DEFAULT_ADULT_AGE)
+
 
 class AuthorizedUser:
     def __init__(self, permission_name: str):
         self.permission_name = permission_name
 
-    async def __call__(self, current_user: get_current_user = Depends(get_current_user)):
+    async def __call__(self, current_user: User = Depends(get_current_user)):
         authorization_exception = HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Forbidden, you don't have permission to access",
         )
 
-        if self.permission_name not in current_user.user_permissions:
+        if not has_permission(current_user, self.permission_name):
             raise authorization_exception
 
 
-async def is_adult_user(current_user: get_current_user = Depends(get_current_user)) -> bool:
-    user_country_age_adult = AdultAgeCountry[current_user.country]
-    if current_user.birthdate:
-        return (date.today().year - current_user.birthdate.year) >= user_country_age_adult
-    return False
+async def is_adult_user(current_user: User = Depends(get_current_user)) -> bool:
+    return is_adult(current_user)
@@ -0,0 +1,528 @@
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from http import HTTPStatus
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from fastapi import HTTPException
+from fastapi.dependencies.utils import get_flat_dependant
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core import auth, json
+from core.auth import User
+from core.authorization import is_adult
+from core.compression import CODECS, Codec, accepts_encoding
+from core.etag import body_etag, etag_matches
+from core.invalidation import CacheInvalidator, get_resource
+from db.base import CACHE_LOCK_KEY_PREFIX, AbstractCacheStorage
+
+logger = logging.getLogger(__name__)
+
+# Пути, ответы для которых не кешируются
+NOT_CACHED_PATHS = ("/api/openapi", "/api/openapi.json")
+
+# Условные заголовки клиента, без которых выполняется фоновое обновление записи:
+# в кеш должен попасть полный ответ, а не 304 на версию, которая есть у клиента
+CONDITIONAL_REQUEST_HEADERS = (b"if-none-match", b"if-modified-since")
+
+# Параметры с поисковыми запросами, регистр и лишние пробелы в которых не влияют на ответ
+SEARCH_QUERY_PARAMS = ("query",)
+
+# Ключи кеша длиннее этого значения заменяются хешем
+CACHE_KEY_MAX_LENGTH = 512
+
+# Тела ответов короче этого размера хранятся в кеше без сжатия
+CACHE_COMPRESS_MIN_SIZE = 1024
+
+
+@dataclass
+class CachedResponse:
+    """
+    Закешированный ответ: статус, заголовки и тело в том виде, в котором их отдало приложение.
+    Хранится одной строкой байт: json с метаданными, перевод строки, тело ответа.
+    Тело может храниться сжатым, тогда encoding содержит значение Content-Encoding.
+    Для успешных ответов etag содержит ETag, выставленный приложением или вычисленный по телу.
+    """
+
+    status: int
+    headers: List[Tuple[str, str]] = field(default_factory=list)
+    body: bytes = b""
+    # Время, после которого запись считается устаревшей и обновляется в фоне
+    stale_at: float = 0
+    encoding: Optional[str] = None
+    etag: Optional[str] = None
+
+    def dumps(self) -> bytes:
+        meta = json.dumps(
+            {
+                "status": self.status,
+                "headers": self.headers,
+                "stale_at": self.stale_at,
+                "encoding": self.encoding,
+                "etag": self.etag,
+            }
+        )
+        return meta.encode() + b"\n" + self.body
+
+    @classmethod
+    def loads(cls, data: bytes) -> "CachedResponse":
+        meta, body = data.split(b"\n", 1)
+        meta = json.loads(meta)
+        return cls(
+            status=meta["status"],
+            headers=[tuple(h) for h in meta["headers"]],
+            body=body,
+            stale_at=meta.get("stale_at", 0),
+            encoding=meta.get("encoding"),
+            etag=meta.get("etag"),
+        )
+
+    @property
+    def is_stale(self) -> bool:
+        return self.stale_at <= time.time()
+
+    def set_body_etag(self) -> None:
+        """ETag по хешу тела для успешного ответа, для которого приложение его не выставило"""
+        if self.etag is None and self.status == HTTPStatus.OK:
+            self.etag = body_etag(self.body)
+            self.headers.append(("etag", self.etag))
+
+    def compress(self, codec: Codec, min_size: int) -> None:
+        """Сжатие тела для хранения, если оно достаточно большое и еще не сжато приложением"""
+        if len(self.body) < min_size or any(name == "content-encoding" for name, _ in self.headers):
+            return
+        self.body = codec.compress(self.body)
+        self.encoding = codec.name
+
+    def raw_headers(
+        self, content_length: int, content_encoding: Optional[str] = None
+    ) -> List[Tuple[bytes, bytes]]:
+        headers = [(name, value) for name, value in self.headers if name != "content-length"]
+        headers.append(("content-length", str(content_length)))
+        if self.encoding is not None:
+            # Ответ по одному ключу кеша отдается сжатым или нет в зависимости от клиента
+            headers.append(("vary", "Accept-Encoding"))
+        if content_encoding is not None:
+            headers.append(("content-encoding", content_encoding))
+        return [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+
+@dataclass
+class CacheTTLPolicy:
+    """
+    Время жизни ответа в кеше в зависимости от статуса.
+    Успешные ответы хранятся expire секунд свежими и еще stale_expire секунд устаревшими,
+    ответы 404 хранятся negative_expire секунд без устаревания, чтобы перебор
+    несуществующих id не доходил до elastic. Остальные ответы, в том числе ошибки
+    и отказы в доступе, не кешируются. Нулевое время жизни отключает кеширование.
+    """
+
+    expire: int
+    stale_expire: int
+    negative_expire: int
+
+    def get_expire(self, status: int) -> Optional[Tuple[int, int]]:
+        """Время жизни свежей и устаревшей записи или None, если ответ не кешируется"""
+        if 200 <= status < 300 and self.expire:
+            return self.expire, self.stale_expire
+        if status == 404 and self.negative_expire:
+            return self.negative_expire, 0
+        return None
+
+    @property
+    def max_expire(self) -> int:
+        return max(self.expire + self.stale_expire, self.negative_expire)
+
+
+class CacheKeyPolicy:
+    """
+    Часть ключа кеша, зависящая от пользователя.
+    Ключ строится не по самому пользователю, а по небольшому набору его атрибутов,
+    от которых зависит ответ (права, совершеннолетие), поэтому пользователи
+    с одинаковыми атрибутами разделяют записи кеша, а ответы не попадают к чужим правам.
+    """
+
+    available_attributes: Dict[str, Callable[[User], Any]] = {
+        "permissions": lambda user: sorted(user.user_permissions),
+        "roles": lambda user: sorted(user.user_roles),
+        "adult": is_adult,
+        "country": lambda user: user.country,
+    }
+
+    def __init__(self, attributes: Iterable[str] = ("permissions", "adult")):
+        self.attributes = sorted(attributes)
+        unknown = set(self.attributes) - set(self.available_attributes)
+        if unknown:
+            raise ValueError(f"Unknown cache key attributes: {', '.join(sorted(unknown))}")
+
+    def get_principal_key(self, user: User) -> bytes:
+        values = {name: self.available_attributes[name](user) for name in self.attributes}
+        return hashlib.sha1(json.dumps(values).encode()).hexdigest().encode()
+
+
+class CacheKeyNormalizer:
+    """
+    Каноничная строка запроса для ключа кеша, чтобы одинаковые по смыслу запросы
+    попадали в одну запись: параметры сортируются по имени (порядок значений одного параметра
+    сохраняется), пропущенные параметры заполняются значениями по умолчанию из объявления
+    обработчика, неизвестные обработчику параметры отбрасываются, а поисковые запросы
+    приводятся к нижнему регистру без лишних пробелов.
+    """
+
+    def __init__(self, search_params: Iterable[str] = SEARCH_QUERY_PARAMS):
+        self.search_params = set(search_params)
+        self._route_params: Dict[str, Tuple[Dict[str, str], frozenset]] = {}
+
+    def normalize(self, scope: Scope) -> bytes:
+        params = parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+        route_params = self.get_route_params(scope)
+        if route_params is not None:
+            defaults, known = route_params
+            params = [(name, value) for name, value in params if name in known]
+            present = {name for name, _ in params}
+            params.extend((name, value) for name, value in defaults.items() if name not in present)
+
+        params = [
+            (name, " ".join(value.split()).casefold() if name in self.search_params else value)
+            for name, value in params
+        ]
+        return urlencode(sorted(params, key=lambda param: param[0])).encode("latin-1")
+
+    def get_route_params(self, scope: Scope) -> Optional[Tuple[Dict[str, str], frozenset]]:
+        """Значения по умолчанию и имена query параметров обработчика запроса"""
+        app = scope.get("app")
+        if app is None:
+            return None
+
+        for route in app.router.routes:
+            if not isinstance(route, APIRoute):
+                continue
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                break
+        else:
+            return None
+
+        if route.unique_id not in self._route_params:
+            query_params = get_flat_dependant(route.dependant).query_params
+            defaults = {
+                param.alias: self.format_default(param.default)
+                for param in query_params
+                if not param.required and param.default is not None
+            }
+            known = frozenset(param.alias for param in query_params)
+            self._route_params[route.unique_id] = (defaults, known)
+        return self._route_params[route.unique_id]
+
+    @staticmethod
+    def format_default(value: Any) -> str:
+        if isinstance(value, Enum):
+            value = value.value
+        if isinstance(value, bool):
+            return str(value).lower()
+        return str(value)
+
+
+class CacheMiddleware:
+    """
+    ASGI middleware для кеширования ответов в AbstractCacheStorage.
+    При промахе тело ответа отдается клиенту по мере готовности и параллельно собирается для кеша,
+    при попадании закешированные байты отправляются как есть, без разбора json.
+
+    Время жизни записи задает CacheTTLPolicy роутера запроса по статусу ответа.
+    Первые expire секунд запись свежая, следующие stale_expire секунд она отдается как есть,
+    а в фоне один запрос ее обновляет.
+    Одновременные промахи по одному ключу объединяются: внутри процесса через общий future,
+    между процессами через блокировку в хранилище кеша.
+
+    Успешные ответы хранятся с ETag, на запрос с совпадающим If-None-Match
+    отдается 304 без тела, как при попадании, так и при промахе.
+
+    Если задан codec, тела ответов хранятся сжатыми и отдаются как есть с Content-Encoding
+    клиентам, которые его принимают, остальным клиентам тело распаковывается.
+    """
+
+    # Интервал опроса кеша, пока запись вычисляет другой процесс
+    lock_poll_interval = 0.05
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        cache_storage: AbstractCacheStorage,
+        key_policy: CacheKeyPolicy,
+        ttl_policy: CacheTTLPolicy,
+        lock_expire: int,
+        router_ttl_policies: Optional[Dict[str, CacheTTLPolicy]] = None,
+        invalidator: Optional[CacheInvalidator] = None,
+        exclude_paths: Iterable[str] = NOT_CACHED_PATHS,
+        key_normalizer: Optional[CacheKeyNormalizer] = None,
+        max_key_length: int = CACHE_KEY_MAX_LENGTH,
+        codec: Optional[Codec] = None,
+        compress_min_size: int = CACHE_COMPRESS_MIN_SIZE,
+    ):
+        self.app = app
+        self.cache_storage = cache_storage
+        self.key_policy = key_policy
+        self.ttl_policy = ttl_policy
+        self.router_ttl_policies = router_ttl_policies or {}
+        self.lock_expire = lock_expire
+        self.invalidator = invalidator
+        self.exclude_paths = set(exclude_paths)
+        self.key_normalizer = key_normalizer or CacheKeyNormalizer()
+        self.max_key_length = max_key_length
+        self.codec = codec
+        self.compress_min_size = compress_min_size
+        self._inflight: Dict[bytes, asyncio.Future] = {}
+        self._refreshing: Dict[bytes, asyncio.Task] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or scope["path"] in self.exclude_paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        user = await self.get_user(scope)
+        if user is None:
+            # Без проверенного пользователя ответ не кешируем, ошибку вернет само приложение
+            await self.app(scope, receive, send)
+            return
+
+        key = self.get_key(scope, user)
+        cached = await self.get_cached(key)
+        if cached is not None:
+            await self.send_cached(cached, scope, send)
+            if cached.is_stale:
+                self.schedule_refresh(scope, key)
+            return
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            cached = await asyncio.shield(inflight)
+            if cached is not None:
+                await self.send_cached(cached, scope, send)
+            else:
+                await self.app(scope, receive, send)
+            return
+
+        future = asyncio.get_event_loop().create_future()
+        self._inflight[key] = future
+        cached = None
+        locked = False
+        try:
+            locked = await self.acquire_lock(key)
+            if not locked:
+                cached = await self.wait_for_cached(key)
+                if cached is not None:
+                    await self.send_cached(cached, scope, send)
+                    return
+
+            cached = await self.call_and_store(scope, receive, send, key)
+        finally:
+            self._inflight.pop(key, None)
+            future.set_result(cached)
+            if locked:
+                await self.release_lock(key)
+
+    async def call_and_store(
+        self, scope: Scope, receive: Receive, send: Send, key: bytes
+    ) -> Optional[CachedResponse]:
+        """Выполнение запроса с сохранением ответа в кеш, если его можно кешировать"""
+        ttl_policy = self.get_ttl_policy(scope["path"])
+        expire: Optional[Tuple[int, int]] = None
+        response: Optional[CachedResponse] = None
+        stored: Optional[CachedResponse] = None
+        start: Optional[Message] = None
+        body: List[bytes] = []
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal expire, response, stored, start
+
+            if message["type"] == "http.response.start":
+                expire = ttl_policy.get_expire(message["status"])
+                if expire is not None:
+                    headers = Headers(raw=message["headers"])
+                    response = CachedResponse(
+                        status=message["status"], headers=headers.items(), etag=headers.get("etag")
+                    )
+                    # Заголовки отправляются вместе с телом, чтобы добавить в них ETag по телу
+                    start = message
+                    return
+
+            elif message["type"] == "http.response.body" and response is not None:
+                body.append(message.get("body", b""))
+                if message.get("more_body", False):
+                    if start is not None:
+                        # Тело отдается частями, ETag по телу будет только у закешированного ответа
+                        await send(start)
+                        start = None
+                    await send(message)
+                    return
+
+                response.body = b"".join(body)
+                response.set_body_etag()
+                if start is None:
+                    await send(message)
+                elif self.is_not_modified(response, scope):
+                    await self.send_not_modified(response, send)
+                else:
+                    await send({**start, "headers": response.raw_headers(len(response.body))})
+                    await send(message)
+
+                fresh_expire, stale_expire = expire
+                response.stale_at = time.time() + fresh_expire
+                if self.codec is not None:
+                    response.compress(self.codec, self.compress_min_size)
+                await self.cache_storage.set(
+                    key=key, value=response.dumps(), expire=fresh_expire + stale_expire
+                )
+                if self.invalidator is not None:
+                    await self.invalidator.tag(key, scope["path"])
+                stored = response
+                return
+
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+        return stored
+
+    def get_ttl_policy(self, path: str) -> CacheTTLPolicy:
+        return self.router_ttl_policies.get(get_resource(path), self.ttl_policy)
+
+    async def get_cached(self, key: bytes) -> Optional[CachedResponse]:
+        data_in_cache = await self.cache_storage.get(key=key)
+        if not data_in_cache:
+            return None
+        return CachedResponse.loads(data_in_cache)
+
+    def schedule_refresh(self, scope: Scope, key: bytes) -> None:
+        """Фоновое обновление устаревшей записи, не больше одного на ключ в процессе"""
+        if key in self._refreshing:
+            return
+
+        scope = {
+            **scope,
+            "headers": [
+                (name, value)
+                for name, value in scope["headers"]
+                if name not in CONDITIONAL_REQUEST_HEADERS
+            ],
+            "state": dict(scope.get("state", {})),
+        }
+        task = asyncio.ensure_future(self.refresh(scope, key))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def refresh(self, scope: Scope, key: bytes) -> None:
+        if not await self.acquire_lock(key):
+            return
+
+        async def receive() -> Message:
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message: Message) -> None:
+            pass
+
+        try:
+            await self.call_and_store(scope, receive, send, key)
+        except Exception:
+            logger.exception(f"Cache refresh for {key!r} failed")
+        finally:
+            await self.release_lock(key)
+
+    @staticmethod
+    def get_lock_key(key: bytes) -> bytes:
+        return CACHE_LOCK_KEY_PREFIX + key
+
+    async def acquire_lock(self, key: bytes) -> bool:
+        return await self.cache_storage.add(
+            key=self.get_lock_key(key), value=b"1", expire=self.lock_expire
+        )
+
+    async def release_lock(self, key: bytes) -> None:
+        await self.cache_storage.delete(key=self.get_lock_key(key))
+
+    async def wait_for_cached(self, key: bytes) -> Optional[CachedResponse]:
+        """Ожидание записи, которую вычисляет другой процесс, не дольше времени жизни блокировки"""
+        deadline = time.monotonic() + self.lock_expire
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.lock_poll_interval)
+            cached = await self.get_cached(key)
+            if cached is not None:
+                return cached
+            if not await self.cache_storage.get(key=self.get_lock_key(key)):
+                # Другой процесс завершил запрос, но не сохранил ответ в кеш
+                break
+        return None
+
+    @staticmethod
+    async def get_user(scope: Scope) -> Optional[User]:
+        """
+        Проверка токена до выполнения запроса.
+        Пользователь сохраняется в request.state, поэтому get_current_user не проверяет токен повторно.
+        """
+        token = Headers(scope=scope).get(auth.api_token_scheme.model.name)
+        if not token:
+            return None
+
+        try:
+            user = await auth.resolve_user(
+                token, auth.auth_client, auth.token_verifier, auth.token_cache
+            )
+        except HTTPException:
+            return None
+
+        scope.setdefault("state", {})["user"] = user
+        return user
+
+    def get_key(self, scope: Scope, user: User) -> bytes:
+        path = scope["path"].encode() + b"?" + self.key_normalizer.normalize(scope)
+        key = path + b"#" + self.key_policy.get_principal_key(user)
+        if len(key) > self.max_key_length:
+            return b"hash:" + hashlib.sha1(key).hexdigest().encode()
+        return key
+
+    @staticmethod
+    def is_not_modified(response: CachedResponse, scope: Scope) -> bool:
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        return response.status == HTTPStatus.OK and etag_matches(if_none_match, response.etag)
+
+    @staticmethod
+    async def send_not_modified(response: CachedResponse, send: Send) -> None:
+        headers = [(b"etag", response.etag.encode("latin-1"))]
+        if response.encoding is not None:
+            headers.append((b"vary", b"Accept-Encoding"))
+        await send(
+            {"type": "http.response.start", "status": HTTPStatus.NOT_MODIFIED, "headers": headers}
+        )
+        await send({"type": "http.response.body", "body": b""})
+
+    @classmethod
+    async def send_cached(cls, response: CachedResponse, scope: Scope, send: Send) -> None:
+        if cls.is_not_modified(response, scope):
+            await cls.send_not_modified(response, send)
+            return
+
+        body, content_encoding = response.body, response.encoding
+        if content_encoding is not None:
+            accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+            if not accepts_encoding(accept_encoding, content_encoding):
+                body, content_encoding = CODECS[content_encoding]().decompress(body), None
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status,
+                "headers": response.raw_headers(len(body), content_encoding),
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
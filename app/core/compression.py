@@ -0,0 +1,121 @@
+import gzip
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Type
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# Отключение сжатия
+IDENTITY = "identity"
+
+
+class Codec(ABC):
+    """Алгоритм сжатия тела ответа, name совпадает со значением заголовка Content-Encoding"""
+
+    name: str = ""
+    default_level: int = 0
+
+    def __init__(self, level: Optional[int] = None):
+        self.level = self.default_level if level is None else level
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        pass
+
+    @abstractmethod
+    def decompress(self, data: bytes) -> bytes:
+        pass
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(level={self.level})"
+
+
+class GzipCodec(Codec):
+    name = "gzip"
+    default_level = 6
+
+    def compress(self, data: bytes) -> bytes:
+        # mtime=0, чтобы одинаковые тела сжимались в одинаковые байты
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def decompress(self, data: bytes) -> bytes:
+        return gzip.decompress(data)
+
+
+class BrotliCodec(Codec):
+    name = "br"
+    default_level = 5
+
+    def compress(self, data: bytes) -> bytes:
+        return brotli.compress(data, quality=self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return brotli.decompress(data)
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return brotli is not None
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    default_level = 3
+
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return zstandard is not None
+
+
+CODECS: Dict[str, Type[Codec]] = {
+    codec.name: codec for codec in (GzipCodec, BrotliCodec, ZstdCodec)
+}
+
+
+def get_codec(name: str, level: Optional[int] = None) -> Optional[Codec]:
+    """Алгоритм сжатия по названию, None для identity"""
+    if not name or name == IDENTITY:
+        return None
+
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"Unknown compression codec: {name}")
+    if not codec.is_available():
+        raise RuntimeError(f'Compression codec "{name}" requires an extra package')
+    return codec(level=level)
+
+
+def accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """Допускает ли клиент кодировку по заголовку Accept-Encoding"""
+    wildcard = False
+    for item in accept_encoding.lower().split(","):
+        name, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+
+        if name == encoding:
+            return quality > 0
+        if name == "*":
+            wildcard = quality > 0
+    return wildcard
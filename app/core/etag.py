@@ -0,0 +1,27 @@
+import hashlib
+from typing import Optional
+
+ETAG_HEADER = "ETag"
+
+
+def version_etag(primary_term: int, seq_no: int) -> str:
+    """Слабый ETag документа по номеру последней операции над ним в elastic"""
+    return f'W/"{primary_term}-{seq_no}"'
+
+
+def body_etag(body: bytes) -> str:
+    """Слабый ETag ответа по хешу тела, тело сравнивается до сжатия"""
+    return f'W/"{hashlib.sha1(body).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """Слабое сравнение ETag со значением заголовка If-None-Match"""
+    if not if_none_match or not etag:
+        return False
+
+    opaque_tag = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque_tag:
+            return True
+    return False
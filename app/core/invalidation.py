@@ -0,0 +1,151 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+
+from aioredis import Redis
+
+from core import json
+from db.base import AbstractCacheStorage
+
+logger = logging.getLogger(__name__)
+
+# Канал, в который etl публикует id обновленных документов
+ETL_UPDATES_CHANNEL = "etl:updated"
+
+# Роутер, ответы которого строятся из документов индекса
+INDEX_RESOURCES = {"movies": "film", "persons": "person", "genres": "genre"}
+
+# Роутеры, ответы которых содержат данные из документов других индексов:
+# персоны содержат роли и фильмы, фильмы содержат имена персон и названия жанров
+DEPENDENT_RESOURCES = {"movies": ["person"], "persons": ["film"], "genres": ["film"]}
+
+
+cache_invalidator: "CacheInvalidator" = None
+
+
+def document_cache_key(index_name: str, doc_id: str) -> bytes:
+    """Ключ кеша отдельного документа индекса, байты, как и ключи кеша ответов"""
+    return f"doc:{index_name}:{str(doc_id).lower()}".encode()
+
+
+class CacheInvalidator:
+    """
+    Инвалидация кеша ответов по событиям etl.
+    Каждый сохраненный ключ помечается тегами: "<роутер>:all" и "<роутер>:<id>" для ответов
+    по конкретному документу или "<роутер>:list" для списков и поиска.
+    Для каждого тега в redis хранится множество ключей кеша.
+    """
+
+    tag_prefix = "cache:tag:"
+
+    def __init__(
+        self,
+        redis: Redis,
+        cache_storage: AbstractCacheStorage,
+        expire: int,
+        channel: str = ETL_UPDATES_CHANNEL,
+    ):
+        self.redis = redis
+        self.cache_storage = cache_storage
+        self.expire = expire
+        self.channel = channel
+        self._listener: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def get_tags(path: str) -> List[str]:
+        resource = get_resource(path)
+        if resource is None:
+            return []
+
+        parts = path.strip("/").split("/")
+        if len(parts) > 3 and is_uuid(parts[3]):
+            return [f"{resource}:all", f"{resource}:{parts[3].lower()}"]
+        return CacheInvalidator.get_list_tags(resource)
+
+    @staticmethod
+    def get_list_tags(resource: str) -> List[str]:
+        """Теги данных, которые зависят от всех документов индекса роутера"""
+        return [f"{resource}:all", f"{resource}:list"]
+
+    @staticmethod
+    def get_invalidated_tags(index_name: str, ids: Iterable[str]) -> List[str]:
+        resource = INDEX_RESOURCES.get(index_name)
+        if resource is None:
+            return []
+
+        tags = [f"{resource}:{str(doc_id).lower()}" for doc_id in ids]
+        tags.append(f"{resource}:list")
+        tags.extend(f"{dependent}:all" for dependent in DEPENDENT_RESOURCES.get(index_name, []))
+        return tags
+
+    async def tag(self, key: bytes, path: str) -> None:
+        """Запоминает ключ кеша ответа в множествах тегов его пути"""
+        await self.add_tags(key, self.get_tags(path))
+
+    async def add_tags(self, key: bytes, tags: List[str]) -> None:
+        """Запоминает ключ кеша в множествах тегов"""
+        if not tags:
+            return
+
+        transaction = self.redis.multi_exec()
+        for tag in tags:
+            transaction.sadd(self.tag_prefix + tag, key)
+            transaction.expire(self.tag_prefix + tag, self.expire)
+        await transaction.execute()
+
+    async def invalidate(self, index_name: str, ids: Iterable[str]) -> int:
+        """Удаляет из кеша ответы, зависящие от обновленных документов"""
+        tag_keys = [self.tag_prefix + tag for tag in self.get_invalidated_tags(index_name, ids)]
+        if not tag_keys:
+            return 0
+
+        # Ключи всех тегов читаются и теги удаляются одной транзакцией
+        transaction = self.redis.multi_exec()
+        for tag_key in tag_keys:
+            transaction.smembers(tag_key, encoding=None)
+        transaction.delete(*tag_keys)
+        *tags_members, _ = await transaction.execute()
+
+        keys = {document_cache_key(index_name, doc_id) for doc_id in ids}
+        for members in tags_members:
+            keys.update(members)
+        await self.cache_storage.delete_many(list(keys))
+
+        logger.info(f'Invalidated {len(keys)} cache keys for "{index_name}" update')
+        return len(keys)
+
+    async def start(self) -> None:
+        """Подписка на события etl"""
+        (channel,) = await self.redis.subscribe(self.channel)
+        self._listener = asyncio.ensure_future(self._listen(channel))
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        await self.redis.unsubscribe(self.channel)
+
+    async def _listen(self, channel) -> None:
+        while await channel.wait_message():
+            message: Dict = await channel.get(decoder=json.loads)
+            try:
+                await self.invalidate(message["index"], message["ids"])
+            except Exception:
+                logger.exception(f"Cache invalidation for {message!r} failed")
+
+
+def get_resource(path: str) -> Optional[str]:
+    """Роутер, к которому относится путь /api/v1/<роутер>/..."""
+    parts = path.strip("/").split("/")
+    if len(parts) < 3:
+        return None
+    return parts[2]
+
+
+def is_uuid(value: str) -> bool:
+    try:
+        UUID(value)
+    except ValueError:
+        return False
+    return True
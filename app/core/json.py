@@ -3,5 +3,10 @@ import orjson
 loads = orjson.loads
 
 
-def dumps(v):
-    return orjson.dumps(v).decode()
+def dumps(v, default=None):
+    return orjson.dumps(v, default=default).decode()
+
+
+def dumps_bytes(v, default=None) -> bytes:
+    """Сериализация сразу в байты, без промежуточной строки"""
+    return orjson.dumps(v, default=default)
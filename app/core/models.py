@@ -1,3 +1,5 @@
+from typing import List, Type
+
 import pydantic
 
 from core import json
@@ -8,3 +10,8 @@ class BaseModel(pydantic.BaseModel):
         # Заменяем стандартную работу с json на более быструю
         json_loads = json.loads
         json_dumps = json.dumps
+
+
+def model_fields(model: Type[pydantic.BaseModel]) -> List[str]:
+    """Поля модели. Используется, чтобы забирать из хранилища только поля, нужные для ответа"""
+    return list(model.__fields__)
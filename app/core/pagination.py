@@ -0,0 +1,11 @@
+from typing import Optional
+
+from fastapi import Response
+
+# Заголовок ответа с курсором следующей страницы, отсутствует на последней странице
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]) -> None:
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
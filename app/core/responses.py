@@ -0,0 +1,35 @@
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi import Response
+
+from core import json
+
+
+def project(doc: Optional[Dict], fields: Optional[Iterable[str]]) -> Optional[Dict]:
+    """Оставляет в документе только поля верхнего уровня из fields"""
+    if doc is None or fields is None:
+        return doc
+    return {field: doc.get(field) for field in fields}
+
+
+class TrustedJSONResponse(Response):
+    """
+    Ответ из документов elasticsearch без повторной валидации моделями pydantic.
+    Документы проверяет etl при загрузке в индекс, поэтому они сериализуются в orjson как есть,
+    из них остаются только поля модели ответа.
+    Возвращенный из обработчика ответ FastAPI не проверяет по response_model,
+    поэтому модель ответа используется только для документации и списка полей.
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, content: Any, fields: Optional[Iterable[str]] = None, **kwargs):
+        self.fields = list(fields) if fields is not None else None
+        super().__init__(content, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, list):
+            content = [project(doc, self.fields) for doc in content]
+        else:
+            content = project(content, self.fields)
+        return json.dumps_bytes(content)
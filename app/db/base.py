@@ -1,8 +1,19 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 DEFAULT_LIMIT = 50
 
+# Количество подсказок при вводе поискового запроса
+DEFAULT_SUGGEST_SIZE = 10
+MAX_SUGGEST_SIZE = 20
+
+# Префикс ключей блокировок на вычисление записей кеша
+CACHE_LOCK_KEY_PREFIX = b"lock:"
+
+
+class InvalidCursor(ValueError):
+    """Курсор страницы поврежден или относится к другому запросу"""
+
 
 class AbstractCacheStorage(ABC):
     """
@@ -10,17 +21,64 @@ class AbstractCacheStorage(ABC):
     """
 
     @abstractmethod
-    async def get(self, key: str) -> Any:
+    async def get(self, key: bytes) -> Any:
         pass
 
+    async def get_many(self, keys: List[bytes]) -> List[Any]:
+        """Значения по списку ключей в том же порядке, None для отсутствующих"""
+        return [await self.get(key) for key in keys]
+
     @abstractmethod
-    async def set(self, key: str, value: str, expire: Optional[int] = None) -> None:
+    async def set(self, key: bytes, value: bytes, expire: Optional[int] = None) -> None:
         pass
 
+    async def set_many(self, items: Dict[bytes, bytes], expire: Optional[int] = None) -> None:
+        """Запись нескольких значений, хранилища переопределяют его одним запросом"""
+        for key, value in items.items():
+            await self.set(key, value, expire)
+
+    @abstractmethod
+    async def add(self, key: bytes, value: bytes, expire: Optional[int] = None) -> bool:
+        """Записать значение, только если ключа еще нет. Используется как распределенная блокировка"""
+        pass
+
+    @abstractmethod
+    async def delete(self, key: bytes) -> None:
+        pass
+
+    async def delete_many(self, keys: List[bytes]) -> None:
+        """Удаление нескольких ключей, хранилища переопределяют его одним запросом"""
+        for key in keys:
+            await self.delete(key)
+
 
 class AbstractDBStorage(ABC):
+    """
+    Абстрактный класс для чтения документов.
+    Параметр fields ограничивает набор возвращаемых полей документа, None - все поля.
+    """
+
+    @abstractmethod
+    async def get(self, id: Any, fields: Optional[List[str]] = None) -> Optional[Dict]:
+        pass
+
+    async def get_versioned(
+        self, id: Any, fields: Optional[List[str]] = None
+    ) -> Optional[Tuple[Dict, Optional[Tuple[int, int]]]]:
+        """
+        Документ и его версия (primary_term, seq_no) одним запросом, None - документа нет.
+        Версия None, если хранилище не ведет версий документов.
+        """
+        doc = await self.get(id, fields=fields)
+        if doc is None:
+            return None
+        return doc, None
+
     @abstractmethod
-    async def get(self, id: Any) -> Optional[Dict]:
+    async def get_many(
+        self, ids: List[Any], fields: Optional[List[str]] = None
+    ) -> List[Optional[Dict]]:
+        """Документы по списку id в том же порядке, None для ненайденных"""
         pass
 
     @abstractmethod
@@ -30,6 +88,7 @@ class AbstractDBStorage(ABC):
         order_map: Optional[dict] = None,
         offset: int = 0,
         limit: int = DEFAULT_LIMIT,
+        fields: Optional[List[str]] = None,
         **kwargs
     ) -> Iterable[Dict]:
         pass
@@ -49,3 +108,34 @@ class AbstractDBStorage(ABC):
             limit=page_size,
             **kwargs
         )
+
+    @abstractmethod
+    async def cursor_page(
+        self,
+        filter_map: Optional[dict] = None,
+        order_map: Optional[dict] = None,
+        page: int = 1,
+        page_size: int = DEFAULT_LIMIT,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        **kwargs
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Страница с курсором следующей страницы.
+        Без курсора страница выбирается по номеру, с курсором - сразу после предыдущей страницы,
+        поэтому стоимость запроса не зависит от глубины.
+
+        :raises InvalidCursor: Если курсор не удалось разобрать
+        """
+        pass
+
+    @abstractmethod
+    async def suggest(
+        self,
+        field: str,
+        prefix: str,
+        size: int = DEFAULT_SUGGEST_SIZE,
+        fields: Optional[List[str]] = None,
+    ) -> List[Dict]:
+        """Документы, у которых поле подсказок начинается с prefix, в порядке веса подсказки"""
+        pass
@@ -1,31 +1,212 @@
+import base64
+import binascii
+import hashlib
+import struct
 from functools import lru_cache
-from typing import Dict, Iterable, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from elasticsearch import AsyncElasticsearch, NotFoundError
+import aiohttp
+from elasticsearch import (
+    AsyncElasticsearch,
+    NotFoundError,
+    RequestError,
+    SerializationError,
+    TransportError,
+)
+from elasticsearch._async.http_aiohttp import (
+    AIOHttpConnection,
+    ESClientResponse,
+    get_running_loop,
+)
+from elasticsearch.serializer import JSONSerializer
 from fastapi import Depends
 
-from db.base import DEFAULT_LIMIT, AbstractDBStorage
+from core import config, json
+from db.base import (
+    DEFAULT_LIMIT,
+    DEFAULT_SUGGEST_SIZE,
+    AbstractDBStorage,
+    InvalidCursor,
+)
 
 es: AsyncElasticsearch = None
 
+# Роли персон в фильме, для каждой роли в индексе фильмов есть вложенное поле "<роль>s"
+FILM_ROLES = ["actor", "director", "writer"]
+
+# Время жизни point in time между запросами страниц по курсору
+PIT_KEEP_ALIVE = "1m"
+
+# Фасеты каталога: максимальное количество жанров и шаг гистограммы рейтинга
+FACET_GENRES_SIZE = 100
+FACET_RATING_INTERVAL = 1
+
+
+class ORJSONSerializer(JSONSerializer):
+    """Сериализатор транспорта elasticsearch на orjson вместо стандартного json"""
+
+    def loads(self, s):
+        try:
+            return json.loads(s)
+        except (ValueError, TypeError) as e:
+            raise SerializationError(s, e)
+
+    def dumps(self, data):
+        # Строки уже сериализованы, например тела bulk запросов
+        if isinstance(data, str):
+            return data
+        try:
+            return json.dumps(data, default=self.default)
+        except (ValueError, TypeError) as e:
+            raise SerializationError(data, e)
+
+
+class ElasticConnection(AIOHttpConnection):
+    """Соединение aiohttp с настраиваемым временем жизни простаивающих keep-alive соединений"""
+
+    def __init__(self, *args, keepalive_timeout: float = 15, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.keepalive_timeout = keepalive_timeout
+
+    async def _create_aiohttp_session(self):
+        if self.loop is None:
+            self.loop = get_running_loop()
+        self.session = aiohttp.ClientSession(
+            headers=self.headers,
+            skip_auto_headers=("accept", "accept-encoding", "user-agent"),
+            auto_decompress=True,
+            loop=self.loop,
+            cookie_jar=aiohttp.DummyCookieJar(),
+            response_class=ESClientResponse,
+            connector=aiohttp.TCPConnector(
+                limit=self._limit,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=True,
+                enable_cleanup_closed=True,
+                ssl=self._ssl_context,
+            ),
+        )
+
+
 # Функция понадобится при внедрении зависимостей
 async def get_elastic() -> AsyncElasticsearch:
     return es
 
 
+class BoolQuery:
+    """
+    Построитель bool запроса.
+    Фильтры попадают в filter context: они не влияют на релевантность и кешируются
+    в query cache elasticsearch, поэтому повторяющиеся фильтры списков почти ничего не стоят.
+    На релевантность влияет только текстовый поиск в must.
+    """
+
+    def __init__(self):
+        self.must: List[Dict] = []
+        self.filter: List[Dict] = []
+
+    def match(self, field: str, value: str) -> "BoolQuery":
+        self.must.append({"match": {field: value}})
+        return self
+
+    def terms(self, field: str, values: Iterable[Any]) -> "BoolQuery":
+        self.filter.append({"terms": {field: [str(value) for value in values]}})
+        return self
+
+    def range(
+        self, field: str, gte: Optional[Any] = None, lte: Optional[Any] = None
+    ) -> "BoolQuery":
+        bounds = {name: value for name, value in (("gte", gte), ("lte", lte)) if value is not None}
+        if bounds:
+            self.filter.append({"range": {field: bounds}})
+        return self
+
+    def nested_terms(self, path: str, field: str, values: Iterable[Any]) -> "BoolQuery":
+        self.filter.append(nested_terms_query(path, field, values))
+        return self
+
+    def any_of(self, queries: List[Dict]) -> "BoolQuery":
+        """Фильтр, которому достаточно совпадения с одним из запросов"""
+        self.filter.append({"bool": {"should": queries, "minimum_should_match": 1}})
+        return self
+
+    def to_dict(self) -> Dict:
+        if not self.must and not self.filter:
+            return {"match_all": {}}
+
+        query = {}
+        if self.must:
+            query["must"] = self.must
+        if self.filter:
+            query["filter"] = self.filter
+        return {"bool": query}
+
+
+def nested_terms_query(path: str, field: str, values: Iterable[Any]) -> Dict:
+    return {
+        "nested": {
+            "path": path,
+            "query": {"terms": {f"{path}.{field}": [str(value) for value in values]}},
+        }
+    }
+
+
 class ElasticStorage(AbstractDBStorage):
-    def __init__(self, elastic: AsyncElasticsearch, index_name: str):
+    def __init__(
+        self,
+        elastic: AsyncElasticsearch,
+        index_name: str,
+        get_timeout: Optional[float] = None,
+        search_timeout: Optional[float] = None,
+    ):
         self.elastic = elastic
         self.index_name = index_name
+        # Таймауты отдельных операций, None - таймаут клиента
+        self.get_timeout = get_timeout
+        self.search_timeout = search_timeout
 
-    async def get(self, id: str) -> Optional[Dict]:
+    async def get(self, id: str, fields: Optional[List[str]] = None) -> Optional[Dict]:
         try:
-            doc = await self.elastic.get(index=self.index_name, id=id)
+            doc = await self.elastic.get(
+                index=self.index_name,
+                id=id,
+                _source_includes=fields,
+                request_timeout=self.get_timeout,
+            )
         except NotFoundError:
             return None
 
         return doc["_source"]
 
+    async def get_versioned(
+        self, id: str, fields: Optional[List[str]] = None
+    ) -> Optional[Tuple[Dict, Optional[Tuple[int, int]]]]:
+        try:
+            doc = await self.elastic.get(
+                index=self.index_name,
+                id=id,
+                _source_includes=fields,
+                request_timeout=self.get_timeout,
+            )
+        except NotFoundError:
+            return None
+
+        return doc["_source"], (doc["_primary_term"], doc["_seq_no"])
+
+    async def get_many(
+        self, ids: List[str], fields: Optional[List[str]] = None
+    ) -> List[Optional[Dict]]:
+        if not ids:
+            return []
+
+        docs = await self.elastic.mget(
+            index=self.index_name,
+            body={"ids": [str(id) for id in ids]},
+            _source_includes=fields,
+            request_timeout=self.get_timeout,
+        )
+        return [doc["_source"] if doc.get("found") else None for doc in docs["docs"]]
+
     async def filter(
         self,
         filter_map: Optional[dict] = None,
@@ -33,67 +214,363 @@ class ElasticStorage(AbstractDBStorage):
         order_map: Optional[dict] = None,
         offset: int = 0,
         limit: int = DEFAULT_LIMIT,
+        fields: Optional[List[str]] = None,
         **kwargs,
     ) -> Iterable[Dict]:
         filter_map = filter_map or {}
         search_map = search_map or {}
         order_map = order_map or {}
 
-        body = {}
-        if filter_map or search_map:
-            body["query"] = self.get_query(filter_map, search_map)
-
+        body = self.get_body(filter_map, search_map, fields)
         docs = await self.elastic.search(
             index=self.index_name,
             sort=[f"{field}:{direction}" for field, direction in order_map.items()],
             from_=offset,
             size=limit,
             body=body,
+            request_timeout=self.search_timeout,
         )
         return [doc["_source"] for doc in docs["hits"]["hits"]]
 
+    async def cursor_page(
+        self,
+        filter_map: Optional[dict] = None,
+        search_map: Optional[dict] = None,
+        order_map: Optional[dict] = None,
+        page: int = 1,
+        page_size: int = DEFAULT_LIMIT,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        **kwargs,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Страница по номеру (from/size) или по курсору (search_after в рамках point in time).
+        Курсор содержит id point in time и значения сортировки последнего документа страницы.
+        Point in time открывается при первом переходе по курсору и закрывается на последней странице.
+
+        :raises InvalidCursor: Если курсор поврежден, выдан для другого индекса или сортировки
+            или elastic отклонил его значения
+        """
+        body = self.get_body(filter_map or {}, search_map or {}, fields)
+        body["sort"] = self.get_sort(order_map or {}, search_map or {})
+        body["size"] = page_size
+        signature = cursor_signature(self.index_name, body["sort"])
+
+        pit_id = None
+        if cursor is None:
+            body["from"] = (page - 1) * page_size
+            docs = await self.elastic.search(
+                index=self.index_name, body=body, request_timeout=self.search_timeout
+            )
+        else:
+            pit_id, body["search_after"] = decode_cursor(cursor, signature, len(body["sort"]))
+            try:
+                docs, pit_id = await self._search_in_pit(body, pit_id)
+            except RequestError as exc:
+                raise InvalidCursor("Invalid page cursor") from exc
+
+        hits = docs["hits"]["hits"]
+        if len(hits) < page_size:
+            if pit_id is not None:
+                await self.elastic.close_point_in_time(
+                    body={"id": pit_id}, ignore=404, request_timeout=self.get_timeout
+                )
+            return [doc["_source"] for doc in hits], None
+
+        return [doc["_source"] for doc in hits], encode_cursor(pit_id, hits[-1]["sort"], signature)
+
+    def make_cursor(
+        self,
+        search_after: List[Any],
+        order_map: Optional[dict] = None,
+        search_map: Optional[dict] = None,
+    ) -> str:
+        """Курсор страницы, следующей за документом со значениями сортировки search_after"""
+        sort = self.get_sort(order_map or {}, search_map or {})
+        return encode_cursor(None, search_after, cursor_signature(self.index_name, sort))
+
+    async def _search_in_pit(self, body: Dict, pit_id: Optional[str]) -> Tuple[Dict, str]:
+        if pit_id is not None:
+            try:
+                docs = await self.elastic.search(
+                    body={**body, "pit": {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE}},
+                    request_timeout=self.search_timeout,
+                )
+                return docs, docs.get("pit_id", pit_id)
+            except NotFoundError:
+                # Point in time истек, продолжаем с новым
+                pass
+
+        pit = await self.elastic.open_point_in_time(
+            index=self.index_name, keep_alive=PIT_KEEP_ALIVE, request_timeout=self.get_timeout
+        )
+        docs = await self.elastic.search(
+            body={**body, "pit": {"id": pit["id"], "keep_alive": PIT_KEEP_ALIVE}},
+            request_timeout=self.search_timeout,
+        )
+        return docs, docs.get("pit_id", pit["id"])
+
+    async def suggest(
+        self,
+        field: str,
+        prefix: str,
+        size: int = DEFAULT_SUGGEST_SIZE,
+        fields: Optional[List[str]] = None,
+    ) -> List[Dict]:
+        """
+        Подсказки completion suggester. Запрос не ищет по индексу, а проходит по префиксному
+        дереву поля в памяти, поэтому дешевле поиска на каждое нажатие клавиши
+        """
+        body = {
+            "suggest": {field: {"prefix": prefix, "completion": {"field": field, "size": size}}}
+        }
+        if fields is not None:
+            body["_source"] = fields
+        docs = await self.elastic.search(
+            index=self.index_name, body=body, request_timeout=self.get_timeout
+        )
+        return [option["_source"] for option in docs["suggest"][field][0]["options"]]
+
+    def get_body(
+        self, filter_map: Dict, search_map: Dict, fields: Optional[List[str]] = None
+    ) -> Dict:
+        body = {}
+        if filter_map or search_map:
+            body["query"] = self.get_query(filter_map, search_map)
+        if fields is not None:
+            # Забираем из _source только нужные поля, меньше работы на fetch фазе и меньше трафика
+            body["_source"] = fields
+        return body
+
+    @staticmethod
+    def get_sort(order_map: Dict, search_map: Dict) -> List[Dict]:
+        """Сортировка с уникальным id в конце, чтобы search_after однозначно продолжал страницу"""
+        sort: List[Dict] = [{field: direction} for field, direction in order_map.items()]
+        if not sort and search_map:
+            sort.append({"_score": "desc"})
+        if "id" not in order_map:
+            sort.append({"id": "asc"})
+        return sort
+
     def get_query(self, filter_map: Dict, search_map: Dict) -> Dict:
-        query = {}
+        query = BoolQuery()
 
         if search_map:
             field, match_obj = list(search_map.items())[0]
-            query["match"] = {field: match_obj}
+            query.match(field, match_obj)
 
-        return query
+        self.add_filters(query, filter_map)
+        return query.to_dict()
 
+    def add_filters(self, query: BoolQuery, filter_map: Dict) -> None:
+        """Фильтры индекса, в базовом хранилище фильтров нет"""
+
+
+def as_list(value: Any) -> List[Any]:
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
 
-class ElasticFilmStorage(ElasticStorage):
-    def get_query(self, filter_map: Dict, search_map: Dict) -> Dict:
-        query = super().get_query(filter_map, search_map)
 
-        if "genre_id" in filter_map:
-            query["nested"] = {
-                "path": "genres",
-                "query": {"term": {"genres.id": str(filter_map["genre_id"])}},
-            }
+def cursor_signature(index_name: str, sort: List[Dict]) -> str:
+    """Подпись индекса и сортировки, для которых выдан курсор"""
+    return hashlib.sha1(json.dumps([index_name, sort]).encode()).hexdigest()[:16]
 
-        for role in ["actor", "director", "writer"]:
+
+def float_sort_value(value: float) -> float:
+    """Значение сортировки поля типа float так, как его возвращает elastic: float32 в виде double"""
+    return struct.unpack("f", struct.pack("f", value))[0]
+
+
+def encode_cursor(pit_id: Optional[str], search_after: List[Any], signature: str) -> str:
+    data = json.dumps({"pit": pit_id, "after": search_after, "sig": signature}).encode()
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def decode_cursor(cursor: str, signature: str, sort_size: int) -> Tuple[Optional[str], List[Any]]:
+    """
+    Id point in time и значения search_after из курсора
+
+    :raises InvalidCursor: Если курсор поврежден или выдан для другого индекса или сортировки
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        pit_id, search_after = data["pit"], data["after"]
+        valid = (
+            data["sig"] == signature
+            and (pit_id is None or isinstance(pit_id, str))
+            and isinstance(search_after, list)
+            and len(search_after) == sort_size
+            and all(value is None or isinstance(value, (str, int, float)) for value in search_after)
+        )
+    except (binascii.Error, ValueError, KeyError, TypeError) as exc:
+        raise InvalidCursor("Invalid page cursor") from exc
+
+    if not valid:
+        raise InvalidCursor("Invalid page cursor")
+    return pit_id, search_after
+
+
+class ElasticFilmStorage(ElasticStorage):
+    def add_filters(self, query: BoolQuery, filter_map: Dict) -> None:
+        """
+        Фильтры фильмов, все условия объединяются через И, значения одного фильтра через ИЛИ:
+        genre_id, <роль>_id и person_ids (любая роль) - id или список id,
+        filmwork_type - тип или список типов, imdb_rating_gte и imdb_rating_lte - границы рейтинга
+        """
+        if filter_map.get("genre_id"):
+            query.nested_terms("genres", "id", as_list(filter_map["genre_id"]))
+
+        for role in FILM_ROLES:
             key = f"{role}_id"
-            if key in filter_map:
-                path = f"{role}s"
-                query["nested"] = {
-                    "path": path,
-                    "query": {"term": {f"{path}.id": str(filter_map[key])}},
+            if filter_map.get(key):
+                query.nested_terms(f"{role}s", "id", as_list(filter_map[key]))
+
+        if filter_map.get("person_ids"):
+            # Фильмы, в которых любая из персон участвовала в любой роли
+            person_ids = as_list(filter_map["person_ids"])
+            query.any_of([nested_terms_query(f"{role}s", "id", person_ids) for role in FILM_ROLES])
+
+        if filter_map.get("filmwork_type"):
+            query.terms("filmwork_type", as_list(filter_map["filmwork_type"]))
+
+        query.range(
+            "imdb_rating",
+            gte=filter_map.get("imdb_rating_gte"),
+            lte=filter_map.get("imdb_rating_lte"),
+        )
+
+    async def get_facets(self, filter_map: Dict) -> Dict[str, List[Dict]]:
+        """
+        Количество фильмов по жанрам, интервалам рейтинга и типам для текущих фильтров.
+        Один поиск с size=0: документы не забираются, считаются только агрегации.
+        """
+        body = {
+            "size": 0,
+            "query": self.get_query(filter_map, {}),
+            "aggs": {
+                "genres": {
+                    "nested": {"path": "genres"},
+                    "aggs": {
+                        "ids": {
+                            "terms": {"field": "genres.id", "size": FACET_GENRES_SIZE},
+                            # Название жанра берется из любого вложенного документа с этим id
+                            "aggs": {"genre": {"top_hits": {"size": 1}}},
+                        }
+                    },
+                },
+                "imdb_rating": {
+                    "histogram": {
+                        "field": "imdb_rating",
+                        "interval": FACET_RATING_INTERVAL,
+                        "min_doc_count": 0,
+                        "extended_bounds": {"min": 0, "max": 10 - FACET_RATING_INTERVAL},
+                    }
+                },
+                "filmwork_type": {"terms": {"field": "filmwork_type"}},
+            },
+        }
+        docs = await self.elastic.search(
+            index=self.index_name, body=body, request_timeout=self.search_timeout
+        )
+
+        aggs = docs["aggregations"]
+        return {
+            "genres": [
+                {
+                    "id": bucket["key"],
+                    "name": bucket["genre"]["hits"]["hits"][0]["_source"]["name"],
+                    "count": bucket["doc_count"],
+                }
+                for bucket in aggs["genres"]["ids"]["buckets"]
+            ],
+            "imdb_rating": [
+                {
+                    "gte": bucket["key"],
+                    "lt": bucket["key"] + FACET_RATING_INTERVAL,
+                    "count": bucket["doc_count"],
                 }
+                for bucket in aggs["imdb_rating"]["buckets"]
+            ],
+            "filmwork_type": [
+                {"type": bucket["key"], "count": bucket["doc_count"]}
+                for bucket in aggs["filmwork_type"]["buckets"]
+            ],
+        }
+
+    async def get_person_films(
+        self, person_id: str, limit: int = DEFAULT_LIMIT, fields: Optional[List[str]] = None
+    ) -> Dict[str, List[Dict]]:
+        """Фильмы персоны, сгруппированные по ролям, не больше limit в каждой роли, одним msearch"""
+        persons_films = await self.get_persons_films([person_id], limit=limit, fields=fields)
+        return persons_films[person_id]
+
+    async def get_persons_films(
+        self, person_ids: List[str], limit: int = DEFAULT_LIMIT, fields: Optional[List[str]] = None
+    ) -> Dict[str, Dict[str, List[Dict]]]:
+        """
+        Фильмы нескольких персон, сгруппированные по ролям, одним msearch.
+        Для каждой персоны и роли выполняется отдельный поиск с лимитом limit, поэтому
+        фильмы одной роли не вытесняют фильмы других ролей и других персон.
+        """
+        if not person_ids:
+            return {}
+
+        searches = [(person_id, role) for person_id in person_ids for role in FILM_ROLES]
+        body = []
+        for person_id, role in searches:
+            body.append({"index": self.index_name})
+            body.append(self.get_person_films_body(person_id, role, limit=limit, fields=fields))
+        result = await self.elastic.msearch(body=body, request_timeout=self.search_timeout)
+
+        persons_films: Dict[str, Dict[str, List[Dict]]] = {
+            person_id: {} for person_id in person_ids
+        }
+        for (person_id, role), docs in zip(searches, result["responses"]):
+            if "error" in docs:
+                raise TransportError(docs.get("status", 500), "msearch", docs["error"])
+            films = [doc["_source"] for doc in docs["hits"]["hits"]]
+            if films:
+                persons_films[person_id][role] = films
+        return persons_films
 
-        return query
+    @staticmethod
+    def get_person_films_body(
+        person_id: str, role: str, limit: int = DEFAULT_LIMIT, fields: Optional[List[str]] = None
+    ) -> Dict:
+        body = {
+            "query": {"bool": {"filter": [nested_terms_query(f"{role}s", "id", [person_id])]}},
+            "sort": [{"id": "asc"}],
+            "size": limit,
+        }
+        if fields is not None:
+            body["_source"] = fields
+        return body
 
 
 @lru_cache()
 def get_genre_storage(elastic: AsyncElasticsearch = Depends(get_elastic)) -> ElasticStorage:
-    return ElasticStorage(elastic=elastic, index_name="genres")
+    return ElasticStorage(
+        elastic=elastic,
+        index_name="genres",
+        get_timeout=config.ELASTIC_GET_TIMEOUT,
+        search_timeout=config.ELASTIC_SEARCH_TIMEOUT,
+    )
 
 
 @lru_cache()
 def get_film_storage(elastic: AsyncElasticsearch = Depends(get_elastic)) -> ElasticFilmStorage:
-    return ElasticFilmStorage(elastic=elastic, index_name="movies")
+    return ElasticFilmStorage(
+        elastic=elastic,
+        index_name="movies",
+        get_timeout=config.ELASTIC_GET_TIMEOUT,
+        search_timeout=config.ELASTIC_SEARCH_TIMEOUT,
+    )
 
 
 @lru_cache()
 def get_person_storage(elastic: AsyncElasticsearch = Depends(get_elastic)) -> ElasticStorage:
-    return ElasticStorage(elastic=elastic, index_name="persons")
+    return ElasticStorage(
+        elastic=elastic,
+        index_name="persons",
+        get_timeout=config.ELASTIC_GET_TIMEOUT,
+        search_timeout=config.ELASTIC_SEARCH_TIMEOUT,
+    )
@@ -1,11 +1,20 @@
 from functools import lru_cache
-from typing import Optional
+from typing import Dict, List, Optional
 
 from aioredis import Redis
 
 from db.base import AbstractCacheStorage
 
+# Время, в течение которого запись в кеше считается свежей
 CACHE_EXPIRE_IN_SECONDS = 60
+# Сколько еще устаревшая запись может отдаваться, пока она обновляется в фоне
+CACHE_STALE_IN_SECONDS = 60 * 5
+# Время жизни ответа 404 в кеше
+CACHE_NEGATIVE_EXPIRE_IN_SECONDS = 10
+# Время жизни блокировки на обновление записи кеша
+CACHE_LOCK_EXPIRE_IN_SECONDS = 10
+# Количество ключей в одной команде удаления
+CACHE_DELETE_BATCH_SIZE = 1000
 
 redis: Redis = None
 
@@ -20,14 +29,45 @@ class RedisStorage(AbstractCacheStorage):
     def __init__(self, redis: Redis):
         self.redis = redis
 
-    async def get(self, key: str):
-        return await self.redis.get(key=key)
+    async def get(self, key: bytes) -> Optional[bytes]:
+        # Значения хранятся как байты, поэтому отключаем декодирование пула
+        return await self.redis.get(key, encoding=None)
 
-    async def set(self, key: str, value: str, expire: Optional[int] = None) -> None:
+    async def get_many(self, keys: List[bytes]) -> List[Optional[bytes]]:
+        if not keys:
+            return []
+        return await self.redis.mget(*keys, encoding=None)
+
+    async def set(self, key: bytes, value: bytes, expire: Optional[int] = None) -> None:
         if expire is None:
             expire = CACHE_EXPIRE_IN_SECONDS
         return await self.redis.set(key=key, value=value, expire=expire)
 
+    async def set_many(self, items: Dict[bytes, bytes], expire: Optional[int] = None) -> None:
+        if not items:
+            return
+        if expire is None:
+            expire = CACHE_EXPIRE_IN_SECONDS
+        # MSET не задает время жизни, поэтому SET с EX для каждого ключа в одном pipeline
+        pipeline = self.redis.pipeline()
+        for key, value in items.items():
+            pipeline.set(key=key, value=value, expire=expire)
+        await pipeline.execute()
+
+    async def add(self, key: bytes, value: bytes, expire: Optional[int] = None) -> bool:
+        if expire is None:
+            expire = CACHE_EXPIRE_IN_SECONDS
+        return await self.redis.set(
+            key=key, value=value, expire=expire, exist=Redis.SET_IF_NOT_EXIST
+        )
+
+    async def delete(self, key: bytes) -> None:
+        await self.redis.delete(key)
+
+    async def delete_many(self, keys: List[bytes]) -> None:
+        for start in range(0, len(keys), CACHE_DELETE_BATCH_SIZE):
+            await self.redis.delete(*keys[start : start + CACHE_DELETE_BATCH_SIZE])
+
 
 @lru_cache()
 async def get_cache_storage() -> RedisStorage:
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from aioredis import Redis
+
+from db.base import CACHE_LOCK_KEY_PREFIX, AbstractCacheStorage
+
+logger = logging.getLogger(__name__)
+
+# Время жизни записи в памяти процесса
+LOCAL_CACHE_EXPIRE_IN_SECONDS = 5
+# Ограничения локального кеша по количеству записей и суммарному размеру значений
+LOCAL_CACHE_MAX_ITEMS = 1000
+LOCAL_CACHE_MAX_BYTES = 32 * 1024 * 1024
+# Канал redis, в который публикуются измененные ключи
+CACHE_INVALIDATION_CHANNEL = "cache:invalidate"
+
+
+cache_storage: "TieredCacheStorage" = None
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_tiered_cache_storage() -> "TieredCacheStorage":
+    return cache_storage
+
+
+class LocalCacheStorage(AbstractCacheStorage):
+    """LRU кеш в памяти процесса с ограничением по количеству записей, размеру и времени жизни"""
+
+    def __init__(
+        self,
+        max_items: int = LOCAL_CACHE_MAX_ITEMS,
+        max_bytes: int = LOCAL_CACHE_MAX_BYTES,
+        expire: int = LOCAL_CACHE_EXPIRE_IN_SECONDS,
+    ):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.expire = expire
+        self.size = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[bytes, Tuple[float, bytes]]" = OrderedDict()
+
+    async def get(self, key: bytes) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._pop(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: bytes, value: bytes, expire: Optional[int] = None) -> None:
+        if len(value) > self.max_bytes:
+            return
+
+        expire = self.expire if expire is None else min(expire, self.expire)
+        self._pop(key)
+        self._entries[key] = (time.monotonic() + expire, value)
+        self.size += len(value)
+
+        while len(self._entries) > self.max_items or self.size > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._pop(oldest_key)
+            self.evictions += 1
+
+    async def add(self, key: bytes, value: bytes, expire: Optional[int] = None) -> bool:
+        if await self.get(key) is not None:
+            return False
+        await self.set(key, value, expire)
+        return True
+
+    async def delete(self, key: bytes) -> None:
+        self._pop(key)
+
+    def _pop(self, key: bytes) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class TieredCacheStorage(AbstractCacheStorage):
+    """
+    Двухуровневый кеш: LRU в памяти процесса перед общим хранилищем (redis).
+    При записи ключ публикуется в канал redis, и остальные процессы удаляют его из своей памяти.
+    Блокировки (add) всегда проверяются в общем хранилище, а ключи блокировок не копируются
+    в память процесса: иначе ожидающий запрос видел бы уже снятую блокировку до 5 секунд.
+    """
+
+    def __init__(
+        self,
+        remote: AbstractCacheStorage,
+        redis: Redis,
+        local: Optional[LocalCacheStorage] = None,
+        channel: str = CACHE_INVALIDATION_CHANNEL,
+    ):
+        self.remote = remote
+        self.redis = redis
+        self.local = local or LocalCacheStorage()
+        self.channel = channel
+        # Идентификатор процесса, чтобы не удалять из памяти только что записанные ключи
+        self.instance_id = uuid.uuid4().hex.encode()
+        self.metrics = {
+            "local_hits": 0,
+            "local_misses": 0,
+            "remote_hits": 0,
+            "remote_misses": 0,
+            "invalidations": 0,
+        }
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Подписка на канал инвалидации"""
+        (channel,) = await self.redis.subscribe(self.channel)
+        self._listener = asyncio.ensure_future(self._listen(channel))
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        await self.redis.unsubscribe(self.channel)
+
+    async def _listen(self, channel) -> None:
+        while await channel.wait_message():
+            message = await channel.get()
+            instance_id, _, key = message.partition(b" ")
+            if instance_id == self.instance_id:
+                continue
+            await self.local.delete(key)
+            self.metrics["invalidations"] += 1
+
+    async def _publish(self, key: bytes) -> None:
+        await self.redis.publish(self.channel, self.instance_id + b" " + key)
+
+    @staticmethod
+    def is_lock_key(key: bytes) -> bool:
+        return key.startswith(CACHE_LOCK_KEY_PREFIX)
+
+    async def get(self, key: bytes) -> Optional[bytes]:
+        if self.is_lock_key(key):
+            return await self.remote.get(key)
+
+        value = await self.local.get(key)
+        if value is not None:
+            self.metrics["local_hits"] += 1
+            return value
+        self.metrics["local_misses"] += 1
+
+        value = await self.remote.get(key)
+        if value is None:
+            self.metrics["remote_misses"] += 1
+            return None
+
+        self.metrics["remote_hits"] += 1
+        await self.local.set(key, value)
+        return value
+
+    async def get_many(self, keys: List[bytes]) -> List[Optional[bytes]]:
+        values = [await self.local.get(key) for key in keys]
+        missed = [i for i, value in enumerate(values) if value is None]
+        self.metrics["local_hits"] += len(keys) - len(missed)
+        self.metrics["local_misses"] += len(missed)
+        if not missed:
+            return values
+
+        remote_values = await self.remote.get_many([keys[i] for i in missed])
+        for i, value in zip(missed, remote_values):
+            if value is None:
+                self.metrics["remote_misses"] += 1
+                continue
+            self.metrics["remote_hits"] += 1
+            await self.local.set(keys[i], value)
+            values[i] = value
+        return values
+
+    async def set(self, key: bytes, value: bytes, expire: Optional[int] = None) -> None:
+        await self.remote.set(key, value, expire)
+        await self.local.set(key, value, expire)
+        await self._publish(key)
+
+    async def set_many(self, items: Dict[bytes, bytes], expire: Optional[int] = None) -> None:
+        if not items:
+            return
+        await self.remote.set_many(items, expire)
+        pipeline = self.redis.pipeline()
+        for key, value in items.items():
+            await self.local.set(key, value, expire)
+            pipeline.publish(self.channel, self.instance_id + b" " + key)
+        await pipeline.execute()
+
+    async def add(self, key: bytes, value: bytes, expire: Optional[int] = None) -> bool:
+        added = await self.remote.add(key, value, expire)
+        if added and not self.is_lock_key(key):
+            await self.local.delete(key)
+            await self._publish(key)
+        return added
+
+    async def delete(self, key: bytes) -> None:
+        await self.remote.delete(key)
+        if self.is_lock_key(key):
+            return
+        await self.local.delete(key)
+        await self._publish(key)
+
+    async def delete_many(self, keys: List[bytes]) -> None:
+        await self.remote.delete_many(keys)
+        pipeline = self.redis.pipeline()
+        for key in keys:
+            if self.is_lock_key(key):
+                continue
+            await self.local.delete(key)
+            pipeline.publish(self.channel, self.instance_id + b" " + key)
+        await pipeline.execute()
+
+    def stats(self) -> Dict:
+        return {
+            **self.metrics,
+            "local_items": len(self.local),
+            "local_bytes": self.local.size,
+            "local_evictions": self.local.evictions,
+        }
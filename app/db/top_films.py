@@ -0,0 +1,63 @@
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from aioredis import Redis
+from fastapi import Depends
+
+from core import json
+from db.redis import get_redis
+
+# Ключи, которые ведет etl (TopFilmsWriter): рейтинги фильмов, общий и по жанрам,
+# краткие данные фильмов и признак того, что в рейтинги загружены все фильмы
+TOP_FILMS_RATING_KEY = "top:films:rating"
+TOP_FILMS_GENRE_RATING_KEY = "top:films:rating:genre:{genre_id}"
+TOP_FILMS_SUMMARY_KEY = "top:films:summary"
+TOP_FILMS_READY_KEY = "top:films:ready"
+
+# Сколько первых фильмов списка отдается из redis, дальше страницы запрашиваются в elastic
+TOP_FILMS_MAX_ITEMS = 1000
+
+
+class TopFilmsStorage:
+    """
+    Первые страницы списка фильмов по убыванию рейтинга из sorted set redis.
+    Порядок совпадает с сортировкой elastic по рейтингу и id: счет фильма - рейтинг со знаком минус,
+    фильмы с равным счетом упорядочены по id, фильмы без рейтинга идут в конце.
+    """
+
+    def __init__(self, redis: Redis, max_items: int = TOP_FILMS_MAX_ITEMS):
+        self.redis = redis
+        self.max_items = max_items
+
+    async def get_range(
+        self, offset: int, limit: int, genre_id: Optional[str] = None
+    ) -> Optional[List[Dict]]:
+        """Краткие данные фильмов страницы или None, если страницу нужно запросить в elastic"""
+        if offset + limit > self.max_items:
+            return None
+
+        key = TOP_FILMS_RATING_KEY
+        if genre_id is not None:
+            key = TOP_FILMS_GENRE_RATING_KEY.format(genre_id=str(genre_id).lower())
+
+        transaction = self.redis.multi_exec()
+        ready = transaction.exists(TOP_FILMS_READY_KEY)
+        film_ids = transaction.zrange(key, offset, offset + limit - 1)
+        await transaction.execute()
+        if not await ready:
+            return None
+
+        film_ids = await film_ids
+        if not film_ids:
+            return []
+
+        summaries = await self.redis.hmget(TOP_FILMS_SUMMARY_KEY, *film_ids)
+        if any(summary is None for summary in summaries):
+            # Рейтинги и краткие данные обновляются etl не атомарно с этим запросом
+            return None
+        return [json.loads(summary) for summary in summaries]
+
+
+@lru_cache()
+def get_top_films_storage(redis: Redis = Depends(get_redis)) -> TopFilmsStorage:
+    return TopFilmsStorage(redis=redis)
@@ -1,21 +1,26 @@
+import dataclasses
 import logging
+from http import HTTPStatus
 
 import aioredis
 import uvicorn as uvicorn
 from elasticsearch import AsyncElasticsearch
 from fastapi import FastAPI, Request
-from fastapi.responses import ORJSONResponse, RedirectResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from fastapi.responses import ORJSONResponse
 
 from api.v1 import film, genre, person
-from core import auth, config, json
-from core.auth import AuthClient
+from core import auth, config, invalidation
+from core.auth import AuthClient, LocalTokenVerifier, TokenCache
+from core.cache import CacheKeyPolicy, CacheMiddleware, CacheTTLPolicy
+from core.compression import get_codec
+from core.invalidation import CacheInvalidator
 from core.logger import LOGGING
-from core.utils import async_iterator_wrapper
-from db import elastic, redis
-from db.base import AbstractCacheStorage
+from db import elastic, redis, tiered
+from db.base import InvalidCursor
 from db.redis import get_cache_storage
+from db.tiered import TieredCacheStorage
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title=config.PROJECT_NAME,
@@ -25,34 +30,9 @@ app = FastAPI(
 )
 
 
-class CacheMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app: ASGIApp, cache_storage: AbstractCacheStorage):
-        super().__init__(app)
-        self.cache_storage = cache_storage
-
-    async def dispatch(self, request: Request, call_next):
-        key = request["raw_path"] + request.get("query_string", "")
-        data_in_cache = await self.cache_storage.get(key=key)
-
-        if data_in_cache:
-            return ORJSONResponse(content=json.loads(data_in_cache))
-
-        response = await call_next(request)
-
-        if response.status_code == 307:
-            return RedirectResponse(url=response.headers.get("location"))
-
-        if response.status_code == 401:
-            return response
-
-        resp_body = [section async for section in response.__dict__["body_iterator"]]
-        response.__setattr__("body_iterator", async_iterator_wrapper(resp_body))
-        resp_body = resp_body[0]
-
-        if key not in (b"/api/openapi", b"/api/openapi.json"):
-            await self.cache_storage.set(key=key, value=resp_body)
-
-        return response
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return ORJSONResponse(status_code=HTTPStatus.BAD_REQUEST, content={"detail": str(exc)})
 
 
 @app.on_event("startup")
@@ -65,12 +45,84 @@ async def startup():
     redis.redis = await aioredis.create_redis_pool(
         address=config.REDIS_DSN, db=0, minsize=10, maxsize=20, encoding="utf-8"
     )
-    elastic.es = AsyncElasticsearch(hosts=[config.ELASTIC_DSN])
-
-    auth.auth_client = AuthClient(base_url=config.AUTH_URL)
+    elastic_options = dict(
+        maxsize=config.ELASTIC_MAXSIZE,
+        http_compress=config.ELASTIC_HTTP_COMPRESS,
+        keepalive_timeout=config.ELASTIC_KEEPALIVE_TIMEOUT,
+        timeout=config.ELASTIC_TIMEOUT,
+        max_retries=config.ELASTIC_MAX_RETRIES,
+        retry_on_timeout=config.ELASTIC_RETRY_ON_TIMEOUT,
+        sniff_on_start=config.ELASTIC_SNIFF,
+        sniff_on_connection_fail=config.ELASTIC_SNIFF,
+    )
+    elastic.es = AsyncElasticsearch(
+        hosts=[config.ELASTIC_DSN],
+        connection_class=elastic.ElasticConnection,
+        serializer=elastic.ORJSONSerializer(),
+        **elastic_options,
+    )
+    logger.info(
+        f"Elasticsearch client options: {elastic_options}, "
+        f"get_timeout={config.ELASTIC_GET_TIMEOUT}, search_timeout={config.ELASTIC_SEARCH_TIMEOUT}"
+    )
 
-    cache_storage = await get_cache_storage()
-    app.add_middleware(CacheMiddleware, cache_storage=cache_storage)
+    auth.auth_client = AuthClient(
+        base_url=config.AUTH_URL,
+        max_connections=config.AUTH_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=config.AUTH_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.AUTH_HTTP_KEEPALIVE_EXPIRY,
+        timeout=config.AUTH_HTTP_TIMEOUT,
+        connect_timeout=config.AUTH_HTTP_CONNECT_TIMEOUT,
+        http2=config.AUTH_HTTP2,
+    )
+    if config.AUTH_TOKEN_CACHE_SIZE and config.AUTH_TOKEN_CACHE_TTL:
+        auth.token_cache = TokenCache(
+            maxsize=config.AUTH_TOKEN_CACHE_SIZE, ttl=config.AUTH_TOKEN_CACHE_TTL
+        )
+    if config.AUTH_VERIFY_MODE == "local":
+        if not config.AUTH_SECRET_KEY:
+            raise RuntimeError("SECRET_KEY is required for local access token verification")
+        # Отозванные токены сервис аутентификации хранит в отдельной базе redis
+        auth_redis = await aioredis.create_redis_pool(
+            address=config.REDIS_DSN, db=config.AUTH_REDIS_DB, minsize=1, maxsize=10
+        )
+        auth.token_verifier = LocalTokenVerifier(
+            secret_key=config.AUTH_SECRET_KEY, redis=auth_redis
+        )
+
+    # Горячие записи кеша дополнительно держим в памяти процесса
+    tiered.cache_storage = TieredCacheStorage(remote=await get_cache_storage(), redis=redis.redis)
+    await tiered.cache_storage.start()
+    # Время жизни ответов в кеше по статусу, отдельно для каждого роутера
+    ttl_policy = CacheTTLPolicy(
+        expire=redis.CACHE_EXPIRE_IN_SECONDS,
+        stale_expire=redis.CACHE_STALE_IN_SECONDS,
+        negative_expire=redis.CACHE_NEGATIVE_EXPIRE_IN_SECONDS,
+    )
+    router_ttl_policies = {
+        router: dataclasses.replace(ttl_policy, **ttl)
+        for router, ttl in config.CACHE_ROUTER_TTL.items()
+    }
+    logger.info(f"Cache ttl policies: {router_ttl_policies}")
+    cache_codec = get_codec(config.CACHE_COMPRESSION, config.CACHE_COMPRESSION_LEVEL)
+    logger.info(f"Cache compression: {cache_codec}")
+    # Удаляем из кеша ответы по событиям об обновлении документов от etl
+    invalidation.cache_invalidator = CacheInvalidator(
+        redis=redis.redis,
+        cache_storage=tiered.cache_storage,
+        expire=max(policy.max_expire for policy in [ttl_policy, *router_ttl_policies.values()]),
+    )
+    await invalidation.cache_invalidator.start()
+    app.add_middleware(
+        CacheMiddleware,
+        cache_storage=tiered.cache_storage,
+        key_policy=CacheKeyPolicy(config.CACHE_KEY_PRINCIPAL_ATTRIBUTES),
+        ttl_policy=ttl_policy,
+        router_ttl_policies=router_ttl_policies,
+        lock_expire=redis.CACHE_LOCK_EXPIRE_IN_SECONDS,
+        invalidator=invalidation.cache_invalidator,
+        codec=cache_codec,
+    )
 
 
 @app.on_event("shutdown")
@@ -78,8 +130,17 @@ async def shutdown():
     """
     Отключаемся от баз при выключении сервера
     """
+    logger.info(f"Cache storage stats: {tiered.cache_storage.stats()}")
+    await invalidation.cache_invalidator.stop()
+    await tiered.cache_storage.stop()
     await redis.redis.close()
     await elastic.es.close()
+    await auth.auth_client.close()
+    if auth.token_cache is not None:
+        logger.info(f"Token cache stats: {auth.token_cache.stats()}")
+    if auth.token_verifier is not None:
+        auth.token_verifier.redis.close()
+        await auth.token_verifier.redis.wait_closed()
 
 
 # Подключаем роутер к серверу, указав префикс /v1/film
@@ -24,3 +24,18 @@ class Film(BaseModel):
     actors: List[Person]
     writers: List[Person]
     directors: List[Person]
+
+
+class FilmShort(BaseModel):
+    """Фильм в списках и поиске"""
+
+    id: UUID4
+    title: str
+    imdb_rating: Optional[float]
+
+
+class FilmSuggest(BaseModel):
+    """Подсказка при вводе названия фильма"""
+
+    id: UUID4
+    title: str
@@ -21,6 +21,13 @@ class Person(BaseModel):
     full_name: str
 
 
+class PersonSuggest(BaseModel):
+    """Подсказка при вводе имени персоны."""
+
+    id: UUID4
+    full_name: str
+
+
 class PersonFilm(BaseModel):
     """Фильмы в которых учавствовала персона."""
 
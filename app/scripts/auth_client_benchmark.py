@@ -0,0 +1,142 @@
+"""
+Пропускная способность проверки токена в сервисе аутентификации: новый httpx.AsyncClient
+на каждый запрос против AuthClient с одним пулом keep-alive соединений.
+Сервис аутентификации заменяется заглушкой check_token на uvicorn в отдельном процессе.
+
+Запуск из каталога app:
+    python -m scripts.auth_client_benchmark --requests 2000 --concurrency 10,50
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import socket
+import statistics
+import time
+from typing import Awaitable, Callable, List, Tuple
+
+import httpx
+import uvicorn
+
+from core import json
+from core.auth import AuthClient
+
+CHECK_TOKEN_PATH = "/staff/api/v1/auth/check_token/"
+
+USER_DATA = json.dumps_bytes(
+    {
+        "user_id": "0f2d2c4e-3f64-4bd4-9d1c-1a4b1c3f5e6a",
+        "user_roles": ["subscriber"],
+        "user_permissions": ["movies_get_film"],
+        "country": "RU",
+        "birthdate": "1990-01-01",
+    }
+)
+
+
+async def stub_auth_app(scope, receive, send):
+    """Заглушка сервиса аутентификации: любой токен принадлежит одному пользователю"""
+    if scope["type"] != "http":
+        return
+
+    while (await receive()).get("more_body", False):
+        pass
+    status = 200 if scope["path"] == CHECK_TOKEN_PATH else 404
+    body = USER_DATA if status == 200 else b""
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+def serve_stub(port: int) -> None:
+    uvicorn.run(stub_auth_app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_stub(base_url: str, timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while True:
+            try:
+                await client.post(CHECK_TOKEN_PATH, json={"token": "t"})
+                return
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+
+
+async def measure(
+    check_token: Callable[[str], Awaitable[httpx.Response]], requests: int, concurrency: int
+) -> Tuple[float, List[float]]:
+    """Запросов в секунду и задержки отдельных запросов в миллисекундах"""
+    timings: List[float] = []
+    queue = iter(range(requests))
+
+    async def worker():
+        for _ in queue:
+            started = time.perf_counter()
+            response = await check_token("token")
+            response.raise_for_status()
+            timings.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - started), timings
+
+
+async def run(base_url: str, requests: int, concurrencies: List[int]) -> None:
+    await wait_for_stub(base_url)
+
+    async def client_per_call(token: str) -> httpx.Response:
+        # Так AuthClient работал до пула соединений
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            return await client.post(CHECK_TOKEN_PATH, json={"token": token})
+
+    pooled = AuthClient(base_url=base_url)
+    print(f"{'concurrency':>12}{'client':>12}{'req/s':>10}{'p50, ms':>10}{'p95, ms':>10}")
+    try:
+        for concurrency in concurrencies:
+            for name, check_token in (
+                ("per call", client_per_call),
+                ("pooled", pooled.check_token),
+            ):
+                await measure(check_token, concurrency, concurrency)
+                rate, timings = await measure(check_token, requests, concurrency)
+                p95 = statistics.quantiles(timings, n=100)[94]
+                print(
+                    f"{concurrency:>12}{name:>12}{rate:>10.0f}"
+                    f"{statistics.median(timings):>10.2f}{p95:>10.2f}"
+                )
+    finally:
+        await pooled.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="запросов для каждого режима")
+    parser.add_argument(
+        "--concurrency", default="10,50", help="параллельных запросов через запятую"
+    )
+    args = parser.parse_args()
+    # Журнал каждого запроса httpx искажает замер
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    port = free_port()
+    stub = multiprocessing.Process(target=serve_stub, args=(port,), daemon=True)
+    stub.start()
+    try:
+        concurrencies = [int(value) for value in args.concurrency.split(",")]
+        asyncio.run(run(f"http://127.0.0.1:{port}", args.requests, concurrencies))
+    finally:
+        stub.terminate()
+        stub.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Сравнение алгоритмов сжатия записей кеша ответов: размер и время сжатия и распаковки.
+
+Запуск из каталога app:
+    python -m scripts.cache_compression_report [body.json ...]
+
+Тела ответов можно сохранить запросами к api, например
+curl -H "TOKEN: ..." "http://localhost:8000/api/v1/film/?page[size]=50" > film_page.json
+Без файлов сравнение выполняется на синтетической странице из 50 фильмов с описаниями.
+"""
+import argparse
+import random
+import timeit
+import uuid
+from typing import Dict, List
+
+from core import json
+from core.compression import CODECS
+
+# Уровни сжатия для сравнения
+CODEC_LEVELS = {"gzip": [1, 6, 9], "br": [1, 5, 11], "zstd": [1, 3, 9]}
+
+WORDS = (
+    "the a of and to in hero city love war space family secret last night world story "
+    "young old dark light return journey friend enemy king queen ship planet time"
+).split()
+
+
+def synthetic_film_page(size: int = 50, seed: int = 0) -> bytes:
+    rnd = random.Random(seed)
+
+    def text(words: int) -> str:
+        return " ".join(rnd.choice(WORDS) for _ in range(words)).capitalize()
+
+    def uid() -> str:
+        return str(uuid.UUID(int=rnd.getrandbits(128), version=4))
+
+    films = [
+        {
+            "id": uid(),
+            "title": text(3),
+            "imdb_rating": round(rnd.uniform(1, 10), 1),
+            "description": text(rnd.randint(40, 120)),
+            "genres": [{"id": uid(), "name": text(1)}],
+            "actors": [{"id": uid(), "full_name": text(2)} for _ in range(4)],
+        }
+        for _ in range(size)
+    ]
+    return json.dumps_bytes(films)
+
+
+def measure(body: bytes, number: int) -> List[Dict]:
+    rows = []
+    for name, codec_class in CODECS.items():
+        if not codec_class.is_available():
+            print(f'Codec "{name}" skipped: package is not installed')
+            continue
+
+        for level in CODEC_LEVELS[name]:
+            codec = codec_class(level=level)
+            compressed = codec.compress(body)
+            compress_time = timeit.timeit(lambda: codec.compress(body), number=number) / number
+            decompress_time = (
+                timeit.timeit(lambda: codec.decompress(compressed), number=number) / number
+            )
+            rows.append(
+                {
+                    "codec": f"{name}:{level}",
+                    "size": len(compressed),
+                    "ratio": len(body) / len(compressed),
+                    "compress_us": compress_time * 1e6,
+                    "decompress_us": decompress_time * 1e6,
+                }
+            )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("bodies", nargs="*", help="файлы с телами ответов")
+    parser.add_argument("--number", type=int, default=200, help="повторов для замера времени")
+    args = parser.parse_args()
+
+    bodies = {}
+    for path in args.bodies:
+        with open(path, "rb") as f:
+            bodies[path] = f.read()
+    if not bodies:
+        bodies["synthetic film page"] = synthetic_film_page()
+
+    for name, body in bodies.items():
+        print(f"{name}: {len(body)} bytes")
+        print(f"{'codec':<10}{'size':>10}{'ratio':>8}{'compress, us':>15}{'decompress, us':>17}")
+        for row in measure(body, args.number):
+            print(
+                f"{row['codec']:<10}{row['size']:>10}{row['ratio']:>8.2f}"
+                f"{row['compress_us']:>15.0f}{row['decompress_us']:>17.0f}"
+            )
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Оценка доли попаданий в кеш ответов по access логу: сырые ключи против каноничных.
+
+Запуск из каталога app:
+    python -m scripts.cache_hit_rate access.log [access.log ...]
+
+Из лога берутся GET запросы к api в формате uvicorn или nginx ("GET <путь> HTTP/1.1" <статус>).
+Кеш считается неограниченным и без истечения записей, пользователь в ключе не учитывается,
+поэтому отчет показывает верхнюю границу доли попаданий и прирост от нормализации ключей.
+"""
+import argparse
+import re
+from collections import Counter
+from typing import Iterable, Iterator, Tuple
+from urllib.parse import urlsplit
+
+from main import app
+
+from core.cache import NOT_CACHED_PATHS, CacheKeyNormalizer
+
+ACCESS_LOG_REQUEST = re.compile(r'"GET (?P<target>\S+) HTTP/[\d.]+" (?P<status>\d{3})')
+
+
+def read_lines(paths: Iterable[str]) -> Iterator[str]:
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            yield from f
+
+
+def read_requests(lines: Iterable[str]) -> Iterator[Tuple[str, bytes, int]]:
+    for line in lines:
+        match = ACCESS_LOG_REQUEST.search(line)
+        if match is None:
+            continue
+
+        target = urlsplit(match["target"])
+        if not target.path.startswith("/api/") or target.path in NOT_CACHED_PATHS:
+            continue
+        yield target.path, target.query.encode("latin-1"), int(match["status"])
+
+
+def replay(lines: Iterable[str]) -> dict:
+    normalizer = CacheKeyNormalizer()
+    raw_keys, canonical_keys = set(), set()
+    stats = Counter()
+
+    for path, query_string, status in read_requests(lines):
+        stats["requests"] += 1
+        if not 200 <= status < 300:
+            # Ответы с ошибками в оценке не участвуют
+            continue
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "query_string": query_string,
+            "app": app,
+        }
+        raw_key = path.encode() + b"?" + query_string
+        canonical_key = path.encode() + b"?" + normalizer.normalize(scope)
+
+        stats["cacheable"] += 1
+        stats["raw_hits"] += raw_key in raw_keys
+        stats["canonical_hits"] += canonical_key in canonical_keys
+        raw_keys.add(raw_key)
+        canonical_keys.add(canonical_key)
+
+    stats["raw_keys"] = len(raw_keys)
+    stats["canonical_keys"] = len(canonical_keys)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("logs", nargs="+", help="файлы access лога")
+    args = parser.parse_args()
+
+    stats = replay(read_lines(args.logs))
+
+    cacheable = stats["cacheable"] or 1
+    print(f"Requests: {stats['requests']}, cacheable: {stats['cacheable']}")
+    for name in ("raw", "canonical"):
+        print(
+            f"{name:>9}: keys {stats[f'{name}_keys']}, hits {stats[f'{name}_hits']}, "
+            f"hit rate {stats[f'{name}_hits'] / cacheable:.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
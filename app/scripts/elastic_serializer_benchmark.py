@@ -0,0 +1,68 @@
+"""
+Время разбора ответов и сериализации запросов транспортом elasticsearch:
+стандартный JSONSerializer против ORJSONSerializer.
+Ответы строятся из документов дампа dumps/movies_db.sql, elastic для замера не нужен.
+
+Запуск из каталога app:
+    python -m scripts.elastic_serializer_benchmark --sizes 1,50,500 --repeat 200
+"""
+import argparse
+import statistics
+import time
+from typing import Callable, List
+
+from elasticsearch.serializer import JSONSerializer
+from scripts.movies_dump import load_documents, search_response
+
+from core.models import model_fields
+from core.responses import project
+from db.elastic import ORJSONSerializer
+from models.film import FilmShort
+
+
+def measure(call: Callable[[], object], repeat: int) -> List[float]:
+    call()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def run(sizes: List[int], repeat: int) -> None:
+    films, _ = load_documents()
+    json_serializer, orjson_serializer = JSONSerializer(), ORJSONSerializer()
+    fields = model_fields(FilmShort)
+
+    cases = []
+    for size in sizes:
+        docs = (films * (size // len(films) + 1))[:size]
+        for name, page in (("full", docs), ("projected", [project(doc, fields) for doc in docs])):
+            response = json_serializer.dumps(search_response(page))
+            cases.append((f"loads {name} {size}", response, "loads"))
+        cases.append((f"dumps {size} docs", docs, "dumps"))
+
+    print(f"{'operation':<24}{'serializer':>12}{'p50, ms':>10}{'p95, ms':>10}")
+    for name, data, operation in cases:
+        for serializer_name, serializer in (
+            ("json", json_serializer),
+            ("orjson", orjson_serializer),
+        ):
+            call = getattr(serializer, operation)
+            timings = measure(lambda: call(data), repeat)
+            p95 = statistics.quantiles(timings, n=100)[94] if len(timings) > 1 else timings[0]
+            print(f"{name:<24}{serializer_name:>12}{statistics.median(timings):>10.3f}{p95:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1,50,500", help="документов в ответе через запятую")
+    parser.add_argument("--repeat", type=int, default=200, help="повторов каждой операции")
+    args = parser.parse_args()
+
+    run([int(size) for size in args.sizes.split(",")], args.repeat)
+
+
+if __name__ == "__main__":
+    main()
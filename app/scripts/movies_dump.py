@@ -0,0 +1,117 @@
+"""
+Документы индексов movies и persons из дампа postgres dumps/movies_db.sql
+в том виде, в котором их загружает etl. Используются скриптами замеров без elastic.
+"""
+import os
+import re
+from collections import defaultdict
+from typing import Dict, Iterator, List, Tuple
+
+from core.config import BASE_DIR
+
+MOVIES_DUMP_PATH = os.path.join(os.path.dirname(BASE_DIR), "dumps", "movies_db.sql")
+
+COPY_STATEMENT = re.compile(r"^COPY public\.(?P<table>\w+) \((?P<columns>[^)]*)\) FROM stdin;$")
+COPY_ESCAPES = {"\\t": "\t", "\\n": "\n", "\\r": "\r", "\\\\": "\\"}
+
+
+def unescape(value: str):
+    if value == "\\N":
+        return None
+    return re.sub(r"\\[tnr\\]", lambda match: COPY_ESCAPES[match.group()], value)
+
+
+def suggest_inputs(text: str) -> List[str]:
+    """Варианты ввода подсказок, как их строит etl: текст, начиная с каждого слова"""
+    words = text.split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+def read_tables(path: str = MOVIES_DUMP_PATH) -> Dict[str, List[Dict]]:
+    """Строки таблиц из блоков COPY дампа"""
+    tables: Dict[str, List[Dict]] = {}
+    with open(path, encoding="utf-8") as f:
+        lines: Iterator[str] = iter(f)
+        for line in lines:
+            match = COPY_STATEMENT.match(line.rstrip("\n"))
+            if match is None:
+                continue
+
+            columns = [column.strip() for column in match["columns"].split(",")]
+            rows = tables.setdefault(match["table"], [])
+            for row in lines:
+                row = row.rstrip("\n")
+                if row == "\\.":
+                    break
+                rows.append(dict(zip(columns, map(unescape, row.split("\t")))))
+    return tables
+
+
+def load_documents(path: str = MOVIES_DUMP_PATH) -> Tuple[List[Dict], List[Dict]]:
+    """Документы фильмов и персон"""
+    tables = read_tables(path)
+
+    genres = {row["id"]: row["name"] for row in tables["movies_genre"]}
+    persons = {
+        row["id"]: " ".join(filter(None, (row["first_name"], row["last_name"])))
+        for row in tables["movies_person"]
+    }
+
+    film_genres = defaultdict(list)
+    for row in tables["movies_filmwork_genres"]:
+        film_genres[row["filmwork_id"]].append(
+            {"id": row["genre_id"], "name": genres[row["genre_id"]]}
+        )
+
+    film_participants = defaultdict(lambda: defaultdict(list))
+    for row in tables["movies_filmwork_participants"]:
+        person = {"id": row["person_id"], "full_name": persons[row["person_id"]]}
+        film_participants[row["filmwork_id"]][f"{row['role']}s"].append(person)
+
+    films = []
+    for row in tables["movies_filmwork"]:
+        participants = film_participants[row["id"]]
+        imdb_rating = float(row["rating"]) if row["rating"] else None
+        films.append(
+            {
+                "id": row["id"],
+                "filmwork_type": row["filmwork_type"],
+                "title": row["title"],
+                "description": row["description"],
+                "imdb_rating": imdb_rating,
+                "genres": film_genres[row["id"]],
+                "directors": participants["directors"],
+                "writers": participants["writers"],
+                "actors": participants["actors"],
+                "title_suggest": {
+                    "input": suggest_inputs(row["title"]),
+                    "weight": int((imdb_rating or 0) * 10),
+                },
+            }
+        )
+
+    person_docs = [
+        {
+            "id": id,
+            "full_name": full_name,
+            "full_name_suggest": {"input": suggest_inputs(full_name)},
+        }
+        for id, full_name in persons.items()
+    ]
+    return films, person_docs
+
+
+def search_response(docs: List[Dict]) -> Dict:
+    """Ответ elastic на поиск с документами docs"""
+    return {
+        "took": 3,
+        "timed_out": False,
+        "hits": {
+            "total": {"value": len(docs), "relation": "eq"},
+            "max_score": None,
+            "hits": [
+                {"_index": "movies", "_id": doc["id"], "_score": None, "_source": doc, "sort": [i]}
+                for i, doc in enumerate(docs)
+            ],
+        },
+    }
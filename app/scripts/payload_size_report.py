@@ -0,0 +1,56 @@
+"""
+Размер ответов elastic с полным _source и с _source, ограниченным полями модели ответа.
+Документы берутся из дампа dumps/movies_db.sql в том виде, в котором их загружает etl,
+поэтому elastic для замера не нужен.
+
+Запуск из каталога app:
+    python -m scripts.payload_size_report --size 50
+"""
+import argparse
+from typing import Dict, List, Optional, Type
+
+import pydantic
+from scripts.movies_dump import load_documents, search_response
+
+from core import json
+from core.models import model_fields
+from core.responses import project
+from models.film import Film, FilmShort
+from models.genre import Genre
+from models.person import Person
+
+
+def response_size(docs: List[Dict], model: Optional[Type[pydantic.BaseModel]]) -> int:
+    fields = model_fields(model) if model is not None else None
+    return len(json.dumps_bytes(search_response([project(doc, fields) for doc in docs])))
+
+
+def report(size: int) -> None:
+    films, persons = load_documents()
+    films.sort(key=lambda film: (-(film["imdb_rating"] or 0), film["id"]))
+    genres = list({genre["id"]: genre for film in films for genre in film["genres"]}.values())
+
+    pages = (
+        ("film list", films[:size], FilmShort),
+        ("film details", films[:1], Film),
+        ("person search", persons[:size], Person),
+        ("genre list", genres[:size], Genre),
+    )
+
+    print(f"{'request':<16}{'docs':>6}{'full, B':>12}{'projected, B':>14}{'saved':>8}")
+    for name, docs, model in pages:
+        full, projected = response_size(docs, None), response_size(docs, model)
+        saved = 1 - projected / full
+        print(f"{name:<16}{len(docs):>6}{full:>12}{projected:>14}{saved:>8.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=50, help="документов на странице списка")
+    args = parser.parse_args()
+
+    report(args.size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Задержка поиска персон в зависимости от размера страницы: фильмы всех персон страницы
+одним msearch против отдельного запроса фильмов для каждой персоны.
+
+Запуск из каталога app при запущенном elastic с загруженными индексами:
+    python -m scripts.person_search_benchmark --sizes 10,50,100 --repeat 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+from elasticsearch import AsyncElasticsearch
+
+from core import config
+from core.models import model_fields
+from db.elastic import ElasticFilmStorage, ElasticStorage, ORJSONSerializer
+from models.person import Person
+from services.person import PersonService
+
+
+async def measure(call: Callable[[], Awaitable], repeat: int) -> List[float]:
+    await call()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def percentile(timings: List[float], q: int) -> float:
+    return statistics.quantiles(timings, n=100)[q - 1] if len(timings) > 1 else timings[0]
+
+
+async def run(sizes: List[int], repeat: int, query: str) -> None:
+    elastic = AsyncElasticsearch(hosts=[config.ELASTIC_DSN], serializer=ORJSONSerializer())
+    person_storage = ElasticStorage(elastic=elastic, index_name="persons")
+    service = PersonService(
+        person_storage=person_storage,
+        film_storage=ElasticFilmStorage(elastic=elastic, index_name="movies"),
+    )
+
+    async def batched(size: int):
+        await service.search_person_by_full_name(page=1, size=size, match_obj=query)
+
+    async def per_person(size: int):
+        persons, _ = await person_storage.cursor_page(
+            search_map={"full_name": query}, page=1, page_size=size, fields=model_fields(Person)
+        )
+        for person in persons:
+            await service.get_person_film_data(person["id"])
+
+    print(f"{'size':>6}{'mode':>12}{'p50, ms':>10}{'p95, ms':>10}")
+    try:
+        for size in sizes:
+            for name, call in (("msearch", batched), ("per person", per_person)):
+                timings = await measure(lambda: call(size), repeat)
+                print(
+                    f"{size:>6}{name:>12}{percentile(timings, 50):>10.1f}"
+                    f"{percentile(timings, 95):>10.1f}"
+                )
+    finally:
+        await elastic.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10,50,100", help="размеры страниц через запятую")
+    parser.add_argument("--repeat", type=int, default=20, help="повторов для каждого размера")
+    parser.add_argument("--query", default="", help="поисковый запрос по имени")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    asyncio.run(run(sizes, args.repeat, args.query))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Работа query cache elasticsearch на фильтрах списка фильмов: счетчики
+_nodes/stats/indices/query_cache до и после повторяющихся запросов страниц списка.
+
+Запуск из каталога app при запущенном elastic с загруженными индексами:
+    python -m scripts.query_cache_report --repeat 50
+
+Elasticsearch кеширует фильтры только в сегментах от 10 000 документов и только
+после нескольких повторов фильтра, поэтому на маленьком индексе счетчики могут не измениться.
+"""
+import argparse
+import asyncio
+from typing import Dict, List
+
+from elasticsearch import AsyncElasticsearch
+
+from core import config
+from core.models import model_fields
+from db.elastic import ElasticFilmStorage, ElasticStorage, ORJSONSerializer
+from models.film import FilmShort
+
+QUERY_CACHE_COUNTERS = (
+    "hit_count",
+    "miss_count",
+    "cache_count",
+    "cache_size",
+    "evictions",
+    "memory_size_in_bytes",
+)
+
+
+async def query_cache_stats(elastic: AsyncElasticsearch) -> Dict[str, int]:
+    """Счетчики query cache, просуммированные по узлам"""
+    stats = await elastic.nodes.stats(metric="indices", index_metric="query_cache")
+    totals = dict.fromkeys(QUERY_CACHE_COUNTERS, 0)
+    for node in stats["nodes"].values():
+        for counter in QUERY_CACHE_COUNTERS:
+            totals[counter] += node["indices"]["query_cache"].get(counter, 0)
+    return totals
+
+
+async def list_filters(elastic: AsyncElasticsearch) -> List[Dict]:
+    """Фильтры, с которыми клиенты чаще всего запрашивают список фильмов"""
+    genres, _ = await ElasticStorage(elastic=elastic, index_name="genres").cursor_page(
+        page_size=3, fields=["id"]
+    )
+    filter_maps = [{"genre_id": genre["id"]} for genre in genres]
+    filter_maps.append({"imdb_rating_gte": 7})
+    filter_maps.append({"filmwork_type": ["movie"], "imdb_rating_gte": 5})
+    if genres:
+        filter_maps.append({"genre_id": genres[0]["id"], "imdb_rating_gte": 7})
+    return filter_maps
+
+
+async def run(repeat: int, page_size: int) -> None:
+    elastic = AsyncElasticsearch(hosts=[config.ELASTIC_DSN], serializer=ORJSONSerializer())
+    film_storage = ElasticFilmStorage(elastic=elastic, index_name="movies")
+    try:
+        filter_maps = await list_filters(elastic)
+        before = await query_cache_stats(elastic)
+        for _ in range(repeat):
+            for filter_map in filter_maps:
+                await film_storage.cursor_page(
+                    filter_map=filter_map,
+                    order_map={"imdb_rating": "desc"},
+                    page_size=page_size,
+                    fields=model_fields(FilmShort),
+                )
+        after = await query_cache_stats(elastic)
+    finally:
+        await elastic.close()
+
+    print(f"{len(filter_maps)} filters x {repeat} requests")
+    print(f"{'counter':<22}{'before':>12}{'after':>12}{'delta':>12}")
+    for counter in QUERY_CACHE_COUNTERS:
+        delta = after[counter] - before[counter]
+        print(f"{counter:<22}{before[counter]:>12}{after[counter]:>12}{delta:>12}")
+
+    lookups = (after["hit_count"] - before["hit_count"]) + (
+        after["miss_count"] - before["miss_count"]
+    )
+    if lookups:
+        print(f"hit rate: {(after['hit_count'] - before['hit_count']) / lookups:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50, help="повторов каждого фильтра")
+    parser.add_argument("--size", type=int, default=50, help="фильмов на странице")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.repeat, args.size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Процессорное время на построение ответа со страницей фильмов: TrustedJSONResponse
+из документов elastic против моделей pydantic, проверки по response_model и JSONResponse.
+Документы берутся из дампа dumps/movies_db.sql, elastic для замера не нужен.
+
+Запуск из каталога app:
+    python -m scripts.response_render_benchmark --sizes 50,500 --repeat 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from scripts.movies_dump import load_documents
+
+from api.v1.film import FilmDetailsModel, FilmListModel
+from core.models import model_fields
+from core.responses import TrustedJSONResponse
+from models.film import Film, FilmShort
+
+
+async def measure(call: Callable[[], Awaitable[bytes]], repeat: int) -> List[float]:
+    await call()
+    timings = []
+    for _ in range(repeat):
+        started = time.process_time()
+        await call()
+        timings.append((time.process_time() - started) * 1000)
+    return timings
+
+
+def pydantic_renderer(model, service_model, docs: List[Dict]) -> Callable[[], Awaitable[bytes]]:
+    """Прежний путь: модели сервиса, проверка по response_model и jsonable_encoder"""
+    field = create_response_field(name="response", type_=List[model])
+
+    async def render() -> bytes:
+        content = [service_model(**doc) for doc in docs]
+        serialized = await serialize_response(field=field, response_content=content)
+        return JSONResponse(serialized).body
+
+    return render
+
+
+def trusted_renderer(model, docs: List[Dict]) -> Callable[[], Awaitable[bytes]]:
+    fields = model_fields(model)
+
+    async def render() -> bytes:
+        return TrustedJSONResponse(docs, fields=fields).body
+
+    return render
+
+
+async def run(sizes: List[int], repeat: int) -> None:
+    films, _ = load_documents()
+    pages = [
+        (f"list {size}", FilmListModel, FilmShort, (films * (size // len(films) + 1))[:size])
+        for size in sizes
+    ]
+    pages.append(("details", FilmDetailsModel, Film, films[:1]))
+
+    print(f"{'page':<12}{'mode':>10}{'p50, ms':>10}{'p95, ms':>10}")
+    for name, model, service_model, docs in pages:
+        for mode, render in (
+            ("pydantic", pydantic_renderer(model, service_model, docs)),
+            ("trusted", trusted_renderer(model, docs)),
+        ):
+            timings = await measure(render, repeat)
+            p95 = statistics.quantiles(timings, n=100)[94] if len(timings) > 1 else timings[0]
+            print(f"{name:<12}{mode:>10}{statistics.median(timings):>10.3f}{p95:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="50,500", help="размеры страниц через запятую")
+    parser.add_argument("--repeat", type=int, default=200, help="повторов для каждого размера")
+    args = parser.parse_args()
+
+    asyncio.run(run([int(size) for size in args.sizes.split(",")], args.repeat))
+
+
+if __name__ == "__main__":
+    main()
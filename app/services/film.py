@@ -1,46 +1,170 @@
 from functools import lru_cache
-from typing import Dict, Iterable, Optional
+from typing import Dict, List, Optional, Tuple
 
 from elasticsearch import AsyncElasticsearch
 from fastapi import Depends
 
-from db.base import AbstractDBStorage
-from db.elastic import get_elastic, get_film_storage
-from models.film import Film
+from core import json
+from core.etag import version_etag
+from core.invalidation import document_cache_key
+from core.models import model_fields
+from db.base import DEFAULT_SUGGEST_SIZE, AbstractCacheStorage
+from db.elastic import (
+    ElasticFilmStorage,
+    as_list,
+    float_sort_value,
+    get_elastic,
+    get_film_storage,
+)
+from db.redis import CACHE_EXPIRE_IN_SECONDS
+from db.tiered import get_tiered_cache_storage
+from db.top_films import TopFilmsStorage, get_top_films_storage
+from models.film import Film, FilmShort, FilmSuggest
 
 
 class FilmService:
-    def __init__(self, film_storage: AbstractDBStorage):
+    def __init__(
+        self,
+        film_storage: ElasticFilmStorage,
+        cache_storage: Optional[AbstractCacheStorage] = None,
+        top_films: Optional[TopFilmsStorage] = None,
+    ):
         self.film_storage = film_storage
+        self.cache_storage = cache_storage
+        self.top_films = top_films
 
-    async def get_by_id(self, film_id: str) -> Optional[Film]:
-        res = await self.film_storage.get(id=film_id)
-        if not res:
+    async def get_with_etag(
+        self, film_id: str, fields: Optional[List[str]] = None
+    ) -> Optional[Tuple[Dict, Optional[str]]]:
+        """Документ фильма и ETag по его версии в индексе из одного запроса, None - фильма нет"""
+        res = await self.film_storage.get_versioned(id=film_id, fields=fields)
+        if res is None:
             return None
-        return Film(**res)
+        doc, version = res
+        return doc, version_etag(*version) if version is not None else None
+
+    async def get_many(self, film_ids: List[str]) -> List[Optional[Dict]]:
+        """
+        Документы фильмов по списку id в порядке запроса, None для ненайденных.
+        Сначала документы ищутся в кеше, отсутствующие запрашиваются одним mget
+        и записываются в кеш одним pipeline.
+        """
+        ids = list(dict.fromkeys(str(film_id).lower() for film_id in film_ids))
+        docs: Dict[str, Optional[Dict]] = {}
+
+        if self.cache_storage is not None:
+            keys = [document_cache_key(self.film_storage.index_name, id) for id in ids]
+            for id, value in zip(ids, await self.cache_storage.get_many(keys)):
+                if value is not None:
+                    docs[id] = json.loads(value)
+
+        missed = [id for id in ids if id not in docs]
+        if missed:
+            # В кеше документы хранятся с полями детальной информации о фильме
+            fetched = await self.film_storage.get_many(missed, fields=model_fields(Film))
+            docs.update(zip(missed, fetched))
+            if self.cache_storage is not None:
+                await self.cache_storage.set_many(
+                    {
+                        document_cache_key(self.film_storage.index_name, id): json.dumps_bytes(doc)
+                        for id, doc in zip(missed, fetched)
+                        if doc is not None
+                    },
+                    expire=CACHE_EXPIRE_IN_SECONDS,
+                )
+
+        return [docs[str(film_id).lower()] for film_id in film_ids]
 
     async def get_page(
-        self, filter_map: dict, page_number: int, page_size: int, sort_value: str, sort_order: str
-    ) -> Iterable[Film]:
-        res = await self.film_storage.page(
+        self,
+        filter_map: dict,
+        page_number: int,
+        page_size: int,
+        sort_value: str,
+        sort_order: str,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        if cursor is None:
+            top_page = await self.get_top_page(
+                filter_map, page_number, page_size, sort_value, sort_order
+            )
+            if top_page is not None:
+                return top_page
+
+        return await self.film_storage.cursor_page(
             filter_map=filter_map,
             order_map={sort_value: sort_order},
             page=page_number,
             page_size=page_size,
+            cursor=cursor,
+            fields=model_fields(FilmShort),
+        )
+
+    async def get_top_page(
+        self, filter_map: dict, page_number: int, page_size: int, sort_value: str, sort_order: str
+    ) -> Optional[Tuple[List[Dict], Optional[str]]]:
+        """
+        Страница списка по убыванию рейтинга, без фильтров или с одним жанром, из рейтингов в redis.
+        Курсор следующей страницы такой же, какой вернул бы elastic. None, если страницу
+        нужно запросить в elastic.
+        """
+        if self.top_films is None or (sort_value, sort_order) != ("imdb_rating", "desc"):
+            return None
+
+        genre_ids = as_list(filter_map.get("genre_id") or [])
+        if set(filter_map) - {"genre_id"} or len(genre_ids) > 1:
+            return None
+
+        films = await self.top_films.get_range(
+            offset=(page_number - 1) * page_size,
+            limit=page_size,
+            genre_id=genre_ids[0] if genre_ids else None,
+        )
+        if films is None:
+            return None
+        if len(films) < page_size:
+            return films, None
+
+        last = films[-1]
+        if last["imdb_rating"] is None:
+            # Значение сортировки документа без рейтинга в курсоре elastic не воспроизводим
+            return None
+        return films, self.film_storage.make_cursor(
+            [float_sort_value(last["imdb_rating"]), last["id"]], order_map={"imdb_rating": "desc"}
         )
-        return (Film(**g) for g in res)
 
-    async def search(self, page: int, size: int, match_obj: str) -> Iterable[Dict]:
+    async def search(
+        self, page: int, size: int, match_obj: str, cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
         """Метод поиска фильмов по названию"""
-        return await self.film_storage.page(
+        return await self.film_storage.cursor_page(
             search_map={"title": match_obj},
             page=page,
             page_size=size,
+            cursor=cursor,
+            fields=model_fields(FilmShort),
+        )
+
+    async def get_facets(self, filter_map: Dict) -> Dict[str, List[Dict]]:
+        """Фасеты каталога для набора фильтров, ответ кеширует CacheMiddleware вместе со списками"""
+        return await self.film_storage.get_facets(filter_map)
+
+    async def suggest(self, prefix: str, size: int = DEFAULT_SUGGEST_SIZE) -> List[Dict]:
+        """Подсказки фильмов по началу слов названия"""
+        return await self.film_storage.suggest(
+            field="title_suggest", prefix=prefix, size=size, fields=model_fields(FilmSuggest)
         )
 
 
 @lru_cache()
 def get_film_service(
-    elastic: AsyncElasticsearch = Depends(get_elastic), film_storage=Depends(get_film_storage)
+    elastic: AsyncElasticsearch = Depends(get_elastic),
+    film_storage=Depends(get_film_storage),
+    cache_storage=Depends(get_tiered_cache_storage),
+    top_films=Depends(get_top_films_storage),
 ) -> FilmService:
-    return FilmService(film_storage=film_storage)
+    return FilmService(
+        film_storage=film_storage,
+        cache_storage=cache_storage,
+        top_films=top_films,
+    )
@@ -1,8 +1,10 @@
 from functools import lru_cache
-from typing import Iterable, Optional
+from typing import Iterable, Optional, Tuple
 
 from fastapi import Depends
 
+from core.etag import version_etag
+from core.models import model_fields
 from db.base import AbstractDBStorage
 from db.elastic import get_genre_storage
 from models.genre import Genre
@@ -14,21 +16,26 @@ class GenreService:
     def __init__(self, genre_storage: AbstractDBStorage):
         self.genre_storage = genre_storage
 
-    async def get_by_id(self, genre_id: str) -> Optional[Genre]:
-        """Метод получения данных о жанре"""
-        res = await self.genre_storage.get(id=genre_id)
-        if not res:
+    async def get_with_etag(self, genre_id: str) -> Optional[Tuple[Genre, Optional[str]]]:
+        """Жанр и ETag по версии документа в индексе из одного запроса, None - жанра нет"""
+        res = await self.genre_storage.get_versioned(id=genre_id)
+        if res is None:
             return None
-        return Genre(**res)
+        doc, version = res
+        return Genre(**doc), version_etag(*version) if version is not None else None
 
     async def get_genres_list(
-        self, page: int, size: int, sort_value: str, sort_order: str
-    ) -> Iterable[Genre]:
+        self, page: int, size: int, sort_value: str, sort_order: str, cursor: Optional[str] = None
+    ) -> Tuple[Iterable[Genre], Optional[str]]:
         """Метод получения данных о списке жанров из elastic"""
-        res = await self.genre_storage.page(
-            order_map={sort_value: sort_order}, page=page, page_size=size
+        res, next_cursor = await self.genre_storage.cursor_page(
+            order_map={sort_value: sort_order},
+            page=page,
+            page_size=size,
+            cursor=cursor,
+            fields=model_fields(Genre),
         )
-        return (Genre(**g) for g in res)
+        return (Genre(**g) for g in res), next_cursor
 
 
 @lru_cache()
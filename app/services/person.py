@@ -3,17 +3,21 @@ from typing import Dict, List, Optional, Tuple
 
 from fastapi import Depends
 
-from db.base import AbstractDBStorage
-from db.elastic import get_film_storage, get_person_storage
-from models.person import Person, RoleType
+from core.models import model_fields
+from db.base import DEFAULT_SUGGEST_SIZE, AbstractDBStorage
+from db.elastic import ElasticFilmStorage, get_film_storage, get_person_storage
+from models.person import Person, PersonFilm, PersonSuggest
 
 PERSON_CACHE_EXPIRE_IN_SECONDS = 60 * 5
 
+# Поля фильма, нужные для ответов по фильмам персоны, роли вычисляются отдельно
+PERSON_FILM_FIELDS = [field for field in model_fields(PersonFilm) if field != "roles"]
+
 
 class PersonService:
     """Бизнес логика получения персон."""
 
-    def __init__(self, person_storage: AbstractDBStorage, film_storage: AbstractDBStorage):
+    def __init__(self, person_storage: AbstractDBStorage, film_storage: ElasticFilmStorage):
         self.person_storage = person_storage
         self.film_storage = film_storage
 
@@ -24,13 +28,18 @@ class PersonService:
             return None, None, None
 
         films = await self.get_person_film_data(person_id)
+        person_roles, film_ids = self.get_roles_and_film_ids(films)
+        return Person(**person), person_roles, film_ids
+
+    @staticmethod
+    def get_roles_and_film_ids(films: Dict) -> Tuple[List[str], List[str]]:
+        """Метод возвращает роли персоны и id фильмов по данным фильмов, сгруппированным по ролям."""
         film_ids = set()
         person_roles = []
         for role, film in films.items():
             person_roles.append(role)
             film_ids.update({film_param["id"] for film_param in film})
-
-        return Person(**person), person_roles, sorted(list(film_ids))
+        return person_roles, sorted(list(film_ids))
 
     async def get_person_film_list(self, person_id: str) -> Optional[List[Dict]]:
         """Метод получения списка фильмов в которых принимала участие персона."""
@@ -51,29 +60,44 @@ class PersonService:
         return [film_param for film_param in person_films.values()]
 
     async def search_person_by_full_name(
-        self, page: int, size: int, match_obj: str
-    ) -> Optional[List[Tuple[Person, List[str], List[str]]]]:
+        self, page: int, size: int, match_obj: str, cursor: Optional[str] = None
+    ) -> Tuple[List[Tuple[Person, List[str], List[str]]], Optional[str]]:
         """Метод поиска персон по полному имени"""
-        persons = await self.person_storage.page(
-            search_map={"full_name": match_obj}, page=page, page_size=size
+        persons, next_cursor = await self.person_storage.cursor_page(
+            search_map={"full_name": match_obj},
+            page=page,
+            page_size=size,
+            cursor=cursor,
+            fields=model_fields(Person),
         )
+        persons_films = await self.get_persons_film_data([person["id"] for person in persons])
+
         full_persons_data = []
         for person in persons:
-            person, person_roles, film_ids = await self.get_by_id(person["id"])
-            full_persons_data.append((person, person_roles, film_ids))
-        return full_persons_data
+            person_roles, film_ids = self.get_roles_and_film_ids(persons_films[person["id"]])
+            full_persons_data.append((Person(**person), person_roles, film_ids))
+        return full_persons_data, next_cursor
 
     async def get_person_film_data(self, person_id: str) -> Dict:
         """Метод возвращает данные фильмов в которых учавствовала персона."""
-        person_films_data = {}
-        all_roles = [role.value for role in RoleType]
-        for role in all_roles:
-            films = await self.film_storage.filter(
-                filter_map={f"{role}_id": person_id}, order_map={"id": "asc"}
-            )
-            if films:
-                person_films_data[role] = [film for film in films]
-        return person_films_data
+        return await self.film_storage.get_person_films(person_id, fields=PERSON_FILM_FIELDS)
+
+    async def get_persons_film_data(self, person_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Метод возвращает данные фильмов для нескольких персон одним запросом.
+        Для каждой персоны выполняется тот же поиск, что и в get_person_film_data,
+        для ролей и id фильмов достаточно поля id.
+        """
+        return await self.film_storage.get_persons_films(person_ids, fields=["id"])
+
+    async def suggest(self, prefix: str, size: int = DEFAULT_SUGGEST_SIZE) -> List[Dict]:
+        """Подсказки персон по началу слов полного имени"""
+        return await self.person_storage.suggest(
+            field="full_name_suggest",
+            prefix=prefix,
+            size=size,
+            fields=model_fields(PersonSuggest),
+        )
 
 
 @lru_cache()
@@ -0,0 +1,137 @@
+import asyncio
+from typing import Dict, List, Optional
+
+from db.base import AbstractCacheStorage
+
+
+class MemoryCacheStorage(AbstractCacheStorage):
+    """Общее хранилище кеша в памяти вместо redis"""
+
+    def __init__(self):
+        self.data: Dict[bytes, bytes] = {}
+        self.expires: Dict[bytes, Optional[int]] = {}
+
+    async def get(self, key: bytes) -> Optional[bytes]:
+        return self.data.get(key)
+
+    async def get_many(self, keys: List[bytes]) -> List[Optional[bytes]]:
+        return [self.data.get(key) for key in keys]
+
+    async def set(self, key: bytes, value: bytes, expire: Optional[int] = None) -> None:
+        self.data[key] = value
+        self.expires[key] = expire
+
+    async def add(self, key: bytes, value: bytes, expire: Optional[int] = None) -> bool:
+        if key in self.data:
+            return False
+        await self.set(key, value, expire)
+        return True
+
+    async def delete(self, key: bytes) -> None:
+        self.data.pop(key, None)
+        self.expires.pop(key, None)
+
+
+class FakePubSubRedis:
+    """Клиент redis, который только запоминает опубликованные сообщения"""
+
+    def __init__(self):
+        self.published: List[tuple] = []
+
+    async def publish(self, channel, message) -> int:
+        self.published.append((channel, message))
+        return 0
+
+
+class FakeTransaction:
+    """
+    Транзакция или pipeline: команды выполняются по порядку при execute,
+    результат каждой команды доступен через future, как в aioredis
+    """
+
+    def __init__(self, redis: "FakeRedis"):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs) -> asyncio.Future:
+            future = asyncio.get_running_loop().create_future()
+            self.commands.append((getattr(self.redis, name), args, kwargs, future))
+            return future
+
+        return command
+
+    async def execute(self) -> list:
+        self.redis.executed += 1
+        results = []
+        for method, args, kwargs, future in self.commands:
+            future.set_result(await method(*args, **kwargs))
+            results.append(future.result())
+        return results
+
+
+class FakeRedis(FakePubSubRedis):
+    """Клиент redis в памяти с командами, которые используют теги кеша и рейтинги фильмов"""
+
+    def __init__(self):
+        super().__init__()
+        self.sets: Dict[bytes, set] = {}
+        self.sorted_sets: Dict[bytes, Dict[bytes, float]] = {}
+        self.hashes: Dict[bytes, Dict[bytes, bytes]] = {}
+        self.strings: Dict[bytes, bytes] = {}
+        self.expires: Dict[bytes, int] = {}
+        # Количество выполненных транзакций и pipeline, то есть обращений к redis
+        self.executed = 0
+
+    @staticmethod
+    def _key(key) -> bytes:
+        return key.encode() if isinstance(key, str) else key
+
+    async def sadd(self, key, *members) -> int:
+        members = {self._key(member) for member in members}
+        added = members - self.sets.setdefault(self._key(key), set())
+        self.sets[self._key(key)].update(members)
+        return len(added)
+
+    async def smembers(self, key, encoding=None) -> list:
+        return list(self.sets.get(self._key(key), set()))
+
+    async def expire(self, key, timeout) -> bool:
+        return self._key(key) in self.sets
+
+    async def delete(self, *keys) -> int:
+        return sum(self.sets.pop(self._key(key), None) is not None for key in keys)
+
+    async def set(self, key, value, expire: int = 0) -> bool:
+        value = value if isinstance(value, bytes) else str(value)
+        self.strings[self._key(key)] = self._key(value)
+        self.expires[self._key(key)] = expire
+        return True
+
+    async def exists(self, key) -> int:
+        return int(self._key(key) in self.strings)
+
+    async def zadd(self, key, score: float, member) -> int:
+        members = self.sorted_sets.setdefault(self._key(key), {})
+        added = self._key(member) not in members
+        members[self._key(member)] = score
+        return int(added)
+
+    async def zrange(self, key, start: int, stop: int) -> list:
+        members = self.sorted_sets.get(self._key(key), {})
+        ordered = sorted(members, key=lambda member: (members[member], member))
+        return ordered[start : stop + 1]
+
+    async def hset(self, key, field, value) -> int:
+        self.hashes.setdefault(self._key(key), {})[self._key(field)] = self._key(value)
+        return 1
+
+    async def hmget(self, key, *fields) -> list:
+        values = self.hashes.get(self._key(key), {})
+        return [values.get(self._key(field)) for field in fields]
+
+    def multi_exec(self) -> FakeTransaction:
+        return FakeTransaction(self)
+
+    def pipeline(self) -> FakeTransaction:
+        return FakeTransaction(self)
@@ -0,0 +1,75 @@
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from core.auth import (
+    get_auth_client,
+    get_current_user,
+    get_token_cache,
+    get_token_verifier,
+)
+from core.authorization import AuthorizedUser, is_adult_user
+
+USER_DATA = {
+    "user_id": "0f2d2c4e-3f64-4bd4-9d1c-1a4b1c3f5e6a",
+    "user_roles": ["subscriber"],
+    "user_permissions": ["movies_get_film"],
+    "country": "RU",
+    "birthdate": "1990-01-01",
+}
+
+
+class StubResponse:
+    status_code = 200
+
+    def __init__(self, data: dict):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class StubAuthClient:
+    """Клиент сервиса аутентификации, который считает запросы проверки токена"""
+
+    def __init__(self, user_data: dict = USER_DATA):
+        self.user_data = user_data
+        self.calls = 0
+
+    async def check_token(self, token):
+        self.calls += 1
+        return StubResponse(self.user_data)
+
+
+def make_app(auth_client: StubAuthClient) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/film/", dependencies=[Depends(AuthorizedUser("movies_get_film"))])
+    async def film(adult=Depends(is_adult_user), current_user=Depends(get_current_user)):
+        return {"adult": adult, "user_id": str(current_user.user_id)}
+
+    app.dependency_overrides[get_auth_client] = lambda: auth_client
+    app.dependency_overrides[get_token_verifier] = lambda: None
+    app.dependency_overrides[get_token_cache] = lambda: None
+    return app
+
+
+def test_one_auth_call_per_request():
+    auth_client = StubAuthClient()
+    client = TestClient(make_app(auth_client))
+
+    response = client.get("/film/", headers={"TOKEN": "token"})
+    assert response.status_code == 200
+    assert response.json() == {"adult": True, "user_id": USER_DATA["user_id"]}
+    assert auth_client.calls == 1
+
+    client.get("/film/", headers={"TOKEN": "token"})
+    assert auth_client.calls == 2
+
+
+def test_missing_permission_is_forbidden_after_one_auth_call():
+    auth_client = StubAuthClient({**USER_DATA, "user_permissions": []})
+    client = TestClient(make_app(auth_client))
+
+    response = client.get("/film/", headers={"TOKEN": "token"})
+    assert response.status_code == 403
+    assert auth_client.calls == 1
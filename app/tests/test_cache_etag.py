@@ -0,0 +1,99 @@
+import asyncio
+import uuid
+
+from tests.fakes import MemoryCacheStorage
+
+from core.auth import User
+from core.cache import CachedResponse, CacheKeyPolicy, CacheMiddleware, CacheTTLPolicy
+from core.etag import version_etag
+
+ETAG = version_etag(1, 7)
+BODY = b'{"id": "film"}'
+USER = User(user_id=uuid.uuid4(), country="RU", user_roles=[], user_permissions=["movies_get_film"])
+
+
+class FilmApp:
+    """Приложение, которое всегда отдает полный ответ с ETag и запоминает заголовки запросов"""
+
+    def __init__(self):
+        self.request_headers = []
+
+    async def __call__(self, scope, receive, send):
+        self.request_headers.append(dict(scope["headers"]))
+        headers = [(b"content-type", b"application/json"), (b"etag", ETAG.encode())]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": BODY})
+
+
+async def get_user(scope):
+    return USER
+
+
+def make_middleware(app: FilmApp) -> CacheMiddleware:
+    middleware = CacheMiddleware(
+        app,
+        cache_storage=MemoryCacheStorage(),
+        key_policy=CacheKeyPolicy(),
+        ttl_policy=CacheTTLPolicy(expire=60, stale_expire=60, negative_expire=0),
+        lock_expire=5,
+    )
+    middleware.get_user = get_user
+    return middleware
+
+
+async def request(middleware: CacheMiddleware, headers=()) -> list:
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/api/v1/film/1/",
+        "query_string": b"",
+        "headers": [(b"token", b"t"), *headers],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware(scope, receive, send)
+    return messages
+
+
+def test_miss_with_matching_etag_stores_full_response_and_sends_304():
+    app = FilmApp()
+    middleware = make_middleware(app)
+
+    messages = asyncio.run(request(middleware, [(b"if-none-match", ETAG.encode())]))
+
+    assert messages[0]["status"] == 304
+    assert messages[1]["body"] == b""
+    [stored] = middleware.cache_storage.data.values()
+    assert CachedResponse.loads(stored).body == BODY
+
+
+def test_refresh_of_stale_entry_drops_conditional_headers():
+    app = FilmApp()
+    middleware = make_middleware(app)
+    conditional = [(b"if-none-match", ETAG.encode()), (b"if-modified-since", b"Mon, 1 Jan 2024")]
+
+    async def scenario():
+        await request(middleware)
+        for key, value in middleware.cache_storage.data.items():
+            cached = CachedResponse.loads(value)
+            cached.stale_at = 0
+            middleware.cache_storage.data[key] = cached.dumps()
+
+        messages = await request(middleware, conditional)
+        await asyncio.gather(*middleware._refreshing.values())
+        return messages
+
+    messages = asyncio.run(scenario())
+
+    assert messages[0]["status"] == 304
+    refresh_headers = app.request_headers[-1]
+    assert b"if-none-match" not in refresh_headers
+    assert b"if-modified-since" not in refresh_headers
+    [stored] = middleware.cache_storage.data.values()
+    assert CachedResponse.loads(stored).body == BODY
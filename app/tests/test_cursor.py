@@ -0,0 +1,79 @@
+import asyncio
+from typing import Tuple
+
+import pytest
+from elasticsearch import RequestError
+
+from db.base import InvalidCursor
+from db.elastic import ElasticStorage, cursor_signature, decode_cursor, encode_cursor
+
+
+class FakeElastic:
+    """Elastic, который отдает полную страницу и отклоняет поиск с search_after"""
+
+    def __init__(self, reject_search_after: bool = False):
+        self.reject_search_after = reject_search_after
+
+    async def search(self, body, index=None, request_timeout=None):
+        if self.reject_search_after and "search_after" in body:
+            raise RequestError(400, "search_phase_execution_exception", {})
+        hits = [
+            {"_source": {"id": str(i)}, "sort": [str(i)] * len(body["sort"])}
+            for i in range(body["size"])
+        ]
+        return {"hits": {"hits": hits}, "pit_id": "pit"}
+
+    async def open_point_in_time(self, index, keep_alive, request_timeout=None):
+        return {"id": "pit"}
+
+
+def next_cursor(storage: ElasticStorage, **kwargs) -> str:
+    _, cursor = asyncio.run(storage.cursor_page(page_size=2, **kwargs))
+    return cursor
+
+
+def signature_of(storage: ElasticStorage) -> Tuple[str, int]:
+    sort = storage.get_sort({}, {})
+    return cursor_signature(storage.index_name, sort), len(sort)
+
+
+def test_cursor_continues_same_index_and_sort():
+    storage = ElasticStorage(FakeElastic(), "genres")
+    cursor = next_cursor(storage, order_map={"name": "asc"})
+
+    docs, _ = asyncio.run(
+        storage.cursor_page(order_map={"name": "asc"}, page_size=2, cursor=cursor)
+    )
+    assert len(docs) == 2
+
+
+def test_cursor_from_other_index_is_rejected():
+    cursor = next_cursor(ElasticStorage(FakeElastic(), "persons"))
+
+    with pytest.raises(InvalidCursor):
+        asyncio.run(ElasticStorage(FakeElastic(), "genres").cursor_page(cursor=cursor))
+
+
+def test_cursor_from_other_sort_is_rejected():
+    storage = ElasticStorage(FakeElastic(), "genres")
+    cursor = next_cursor(storage, order_map={"name": "asc"})
+
+    with pytest.raises(InvalidCursor):
+        asyncio.run(storage.cursor_page(order_map={"name": "desc"}, cursor=cursor))
+
+
+def test_edited_cursor_is_rejected():
+    storage = ElasticStorage(FakeElastic(), "genres")
+    pit_id, search_after = decode_cursor(next_cursor(storage), *signature_of(storage))
+    tampered = encode_cursor(pit_id, [*search_after, {"id": "1"}], signature_of(storage)[0])
+
+    with pytest.raises(InvalidCursor):
+        asyncio.run(storage.cursor_page(cursor=tampered))
+
+
+def test_cursor_rejected_by_elastic_is_invalid():
+    cursor = next_cursor(ElasticStorage(FakeElastic(), "genres"))
+    storage = ElasticStorage(FakeElastic(reject_search_after=True), "genres")
+
+    with pytest.raises(InvalidCursor):
+        asyncio.run(storage.cursor_page(cursor=cursor))
@@ -0,0 +1,80 @@
+import asyncio
+from uuid import uuid4
+
+from tests.fakes import FakeRedis, MemoryCacheStorage
+
+from core import json
+from core.invalidation import document_cache_key
+from core.models import model_fields
+from db.redis import RedisStorage
+from db.tiered import TieredCacheStorage
+from models.film import Film
+from services.film import FilmService
+
+FILMS = {
+    str(uuid4()): {"id": "", "title": "Film", "description": "", "title_suggest": {"input": []}}
+    for _ in range(5)
+}
+for film_id, film in FILMS.items():
+    film["id"] = film_id
+
+
+class FakeFilmStorage:
+    """Хранилище фильмов, которое запоминает запросы mget"""
+
+    index_name = "movies"
+
+    def __init__(self):
+        self.calls = []
+
+    async def get_many(self, ids, fields=None):
+        self.calls.append((list(ids), fields))
+        docs = [FILMS.get(id) for id in ids]
+        return [
+            {field: doc.get(field) for field in fields} if doc and fields else doc for doc in docs
+        ]
+
+
+class CountingCacheStorage(MemoryCacheStorage):
+    def __init__(self):
+        super().__init__()
+        self.set_calls = 0
+        self.set_many_calls = 0
+
+    async def set(self, key, value, expire=None):
+        self.set_calls += 1
+        await super().set(key, value, expire)
+
+    async def set_many(self, items, expire=None):
+        self.set_many_calls += 1
+        self.data.update(items)
+
+
+def test_missed_documents_are_cached_in_one_batch():
+    redis, remote, storage = FakeRedis(), CountingCacheStorage(), FakeFilmStorage()
+    service = FilmService(
+        film_storage=storage, cache_storage=TieredCacheStorage(remote=remote, redis=redis)
+    )
+    ids = [*FILMS, str(uuid4())]
+
+    docs = asyncio.run(service.get_many(ids))
+
+    assert [doc and doc["id"] for doc in docs] == [*FILMS, None]
+    assert storage.calls == [(ids, model_fields(Film))]
+    assert (remote.set_calls, remote.set_many_calls) == (0, 1)
+    assert redis.executed == 1
+    assert len(redis.published) == len(FILMS)
+
+    cached = json.loads(remote.data[document_cache_key("movies", ids[0])])
+    assert "title_suggest" not in cached
+
+
+def test_redis_set_many_uses_one_pipeline():
+    redis = FakeRedis()
+    items = {b"doc:movies:1": b"1", b"doc:movies:2": b"2"}
+
+    asyncio.run(RedisStorage(redis).set_many(items, expire=30))
+
+    assert redis.executed == 1
+    assert {key: redis.strings[key] for key in items} == items
+    assert redis.expires[b"doc:movies:1"] == 30
@@ -0,0 +1,85 @@
+import asyncio
+from uuid import uuid4
+
+from tests.fakes import FakeRedis, MemoryCacheStorage
+
+from core.invalidation import CacheInvalidator, document_cache_key
+from db.tiered import TieredCacheStorage
+
+FILM_ID = str(uuid4())
+OTHER_FILM_ID = str(uuid4())
+PERSON_ID = str(uuid4())
+GENRE_ID = str(uuid4())
+
+FILM_KEY = f"/api/v1/film/{FILM_ID}/?#u".encode()
+OTHER_FILM_KEY = f"/api/v1/film/{OTHER_FILM_ID}/?#u".encode()
+FILM_LIST_KEY = b"/api/v1/film/?page=1#u"
+PERSON_KEY = f"/api/v1/person/{PERSON_ID}/?#u".encode()
+GENRE_KEY = f"/api/v1/genre/{GENRE_ID}/?#u".encode()
+
+
+def make_invalidator(cache_storage=None):
+    redis = FakeRedis()
+    cache_storage = cache_storage or MemoryCacheStorage()
+    return CacheInvalidator(redis=redis, cache_storage=cache_storage, expire=60), cache_storage
+
+
+async def cache_responses(invalidator: CacheInvalidator, cache_storage) -> None:
+    for key in (FILM_KEY, OTHER_FILM_KEY, FILM_LIST_KEY, PERSON_KEY, GENRE_KEY):
+        await cache_storage.set(key, b"body")
+        await invalidator.tag(key, key.decode().split("?")[0])
+
+
+def test_film_update_evicts_its_responses_and_lists():
+    invalidator, cache_storage = make_invalidator()
+
+    async def scenario():
+        await cache_responses(invalidator, cache_storage)
+        await invalidator.invalidate("movies", [FILM_ID])
+
+    asyncio.run(scenario())
+    assert FILM_KEY not in cache_storage.data
+    assert FILM_LIST_KEY not in cache_storage.data
+    assert OTHER_FILM_KEY in cache_storage.data
+    assert GENRE_KEY in cache_storage.data
+
+
+def test_film_update_evicts_dependent_person_responses():
+    invalidator, cache_storage = make_invalidator()
+
+    async def scenario():
+        await cache_responses(invalidator, cache_storage)
+        await invalidator.invalidate("movies", [FILM_ID])
+
+    asyncio.run(scenario())
+    assert PERSON_KEY not in cache_storage.data
+
+
+def test_genre_update_evicts_all_film_responses():
+    invalidator, cache_storage = make_invalidator()
+
+    async def scenario():
+        await cache_responses(invalidator, cache_storage)
+        await invalidator.invalidate("genres", [GENRE_ID])
+
+    asyncio.run(scenario())
+    assert GENRE_KEY not in cache_storage.data
+    assert FILM_KEY not in cache_storage.data
+    assert OTHER_FILM_KEY not in cache_storage.data
+    assert FILM_LIST_KEY not in cache_storage.data
+    assert PERSON_KEY in cache_storage.data
+
+
+def test_invalidation_evicts_documents_from_local_tier():
+    remote = MemoryCacheStorage()
+    storage = TieredCacheStorage(remote=remote, redis=FakeRedis())
+    invalidator, _ = make_invalidator(storage)
+    doc_key = document_cache_key("movies", FILM_ID)
+
+    async def scenario():
+        await storage.set(doc_key, b"{}")
+        await invalidator.invalidate("movies", [FILM_ID])
+        return await storage.get(doc_key)
+
+    assert asyncio.run(scenario()) is None
+    assert doc_key not in remote.data
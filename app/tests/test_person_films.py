@@ -0,0 +1,84 @@
+import asyncio
+from uuid import uuid4
+
+from db.elastic import ElasticFilmStorage
+from services.person import PersonService
+
+PROLIFIC_ID = str(uuid4())
+OTHER_ID = str(uuid4())
+
+
+def make_films():
+    films = []
+    for i in range(300):
+        films.append({"id": f"{i:04d}", "actors": [{"id": PROLIFIC_ID}], "directors": []})
+    for i in range(2):
+        films.append({"id": f"8{i:03d}", "actors": [], "directors": [{"id": PROLIFIC_ID}]})
+    for i in range(3):
+        films.append(
+            {"id": f"9{i:03d}", "actors": [{"id": OTHER_ID}], "writers": [{"id": OTHER_ID}]}
+        )
+    return films
+
+
+class FakeElastic:
+    """Выполняет запросы фильмов персоны в роли из get_person_films_body по списку документов"""
+
+    def __init__(self, films):
+        self.films = films
+        self.requests = 0
+
+    def run(self, body):
+        [nested] = body["query"]["bool"]["filter"]
+        path = nested["nested"]["path"]
+        person_ids = nested["nested"]["query"]["terms"][f"{path}.id"]
+        hits = [
+            {"_source": {field: film.get(field) for field in body.get("_source", film)}}
+            for film in sorted(self.films, key=lambda film: film["id"])
+            if any(person["id"] in person_ids for person in film.get(path, []))
+        ]
+        return {"hits": {"hits": hits[: body["size"]]}}
+
+    async def msearch(self, body, request_timeout=None):
+        self.requests += 1
+        return {"responses": [self.run(search) for search in body[1::2]]}
+
+
+def make_service(elastic: FakeElastic) -> PersonService:
+    return PersonService(person_storage=None, film_storage=ElasticFilmStorage(elastic, "movies"))
+
+
+def test_persons_films_match_single_person_lookup():
+    elastic = FakeElastic(make_films())
+    service = make_service(elastic)
+
+    async def scenario():
+        batch = await service.get_persons_film_data([PROLIFIC_ID, OTHER_ID])
+        single = {
+            person_id: await service.get_person_film_data(person_id)
+            for person_id in (PROLIFIC_ID, OTHER_ID)
+        }
+        return batch, single
+
+    batch, single = asyncio.run(scenario())
+    for person_id in (PROLIFIC_ID, OTHER_ID):
+        assert service.get_roles_and_film_ids(batch[person_id]) == service.get_roles_and_film_ids(
+            single[person_id]
+        )
+
+    assert service.get_roles_and_film_ids(batch[OTHER_ID]) == (
+        ["actor", "writer"],
+        ["9000", "9001", "9002"],
+    )
+    # Один msearch на страницу персон и по одному на каждую персону
+    assert elastic.requests == 3
+
+
+def test_films_are_limited_per_role():
+    service = make_service(FakeElastic(make_films()))
+
+    films = asyncio.run(service.get_person_film_data(PROLIFIC_ID))
+
+    # 300 фильмов в роли актера не вытесняют фильмы, где персона режиссер
+    assert len(films["actor"]) == 50
+    assert [film["id"] for film in films["director"]] == ["8000", "8001"]
@@ -0,0 +1,38 @@
+import asyncio
+
+from tests.fakes import FakePubSubRedis, MemoryCacheStorage
+
+from db.tiered import TieredCacheStorage
+
+
+def make_storage():
+    remote = MemoryCacheStorage()
+    redis = FakePubSubRedis()
+    return TieredCacheStorage(remote=remote, redis=redis), remote, redis
+
+
+def test_values_are_kept_in_local_tier():
+    storage, remote, _ = make_storage()
+
+    async def scenario():
+        await remote.set(b"/api/v1/film/?#u", b"body")
+        assert await storage.get(b"/api/v1/film/?#u") == b"body"
+        await remote.delete(b"/api/v1/film/?#u")
+        return await storage.get(b"/api/v1/film/?#u")
+
+    assert asyncio.run(scenario()) == b"body"
+
+
+def test_lock_keys_are_always_read_from_remote():
+    storage, remote, redis = make_storage()
+
+    async def scenario():
+        assert await storage.add(b"lock:key", b"1", expire=10)
+        assert await storage.get(b"lock:key") == b"1"
+        # Блокировку снял другой процесс
+        await remote.delete(b"lock:key")
+        return await storage.get(b"lock:key")
+
+    assert asyncio.run(scenario()) is None
+    assert len(storage.local) == 0
+    assert redis.published == []
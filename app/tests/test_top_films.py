@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from tests.fakes import FakeRedis
+
+from core import json
+from core.models import model_fields
+from db.elastic import ElasticFilmStorage, float_sort_value
+from db.top_films import (
+    TOP_FILMS_RATING_KEY,
+    TOP_FILMS_READY_KEY,
+    TOP_FILMS_SUMMARY_KEY,
+    TopFilmsStorage,
+)
+from models.film import FilmShort
+from services.film import FilmService
+
+# Равные рейтинги проверяют порядок по id, 8.6 и 7.3 не представимы точно во float32
+FILMS = [
+    {"id": f"{i:08x}-0000-0000-0000-000000000000", "title": f"Film {i}", "imdb_rating": rating}
+    for i, rating in enumerate([7.3, 8.6, 5.0, 7.3, 9.1, 8.6, 6.4, 7.3, 2.2, 8.6, 4.7])
+]
+
+
+class FakeElastic:
+    """Elastic, который сортирует фильмы по убыванию рейтинга и по id, как индекс movies"""
+
+    async def search(self, body, index=None, request_timeout=None):
+        assert body["sort"] == [{"imdb_rating": "desc"}, {"id": "asc"}]
+        ordered = sorted(FILMS, key=lambda film: (-film["imdb_rating"], film["id"]))
+        page = ordered[body["from"] : body["from"] + body["size"]]
+        hits = [
+            {
+                "_source": {field: film[field] for field in body["_source"]},
+                "sort": [float_sort_value(film["imdb_rating"]), film["id"]],
+            }
+            for film in page
+        ]
+        return {"hits": {"hits": hits}}
+
+
+def make_redis() -> FakeRedis:
+    """Рейтинги в redis в том виде, в котором их записывает etl"""
+    redis = FakeRedis()
+
+    async def load():
+        for film in FILMS:
+            await redis.zadd(TOP_FILMS_RATING_KEY, -film["imdb_rating"], film["id"])
+            await redis.hset(TOP_FILMS_SUMMARY_KEY, film["id"], json.dumps(film))
+        await redis.set(TOP_FILMS_READY_KEY, 1)
+
+    asyncio.run(load())
+    return redis
+
+
+@pytest.mark.parametrize("page_number,page_size", [(1, 3), (2, 3), (3, 4), (1, 11), (2, 5)])
+def test_top_page_matches_elastic(page_number, page_size):
+    service = FilmService(
+        film_storage=ElasticFilmStorage(FakeElastic(), "movies"),
+        top_films=TopFilmsStorage(make_redis()),
+    )
+    args = ({}, page_number, page_size, "imdb_rating", "desc")
+
+    top_films, top_cursor = asyncio.run(service.get_top_page(*args))
+    films, cursor = asyncio.run(
+        service.film_storage.cursor_page(
+            order_map={"imdb_rating": "desc"},
+            page=page_number,
+            page_size=page_size,
+            fields=model_fields(FilmShort),
+        )
+    )
+
+    assert [film["id"] for film in top_films] == [film["id"] for film in films]
+    assert top_cursor == cursor
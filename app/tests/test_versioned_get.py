@@ -0,0 +1,30 @@
+import asyncio
+
+from db.elastic import ElasticStorage
+from services.film import FilmService
+
+FILM = {"id": "film", "title": "Film", "imdb_rating": 7.5}
+
+
+class FakeElastic:
+    """Elastic, который считает запросы get"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def get(self, index, id, **kwargs):
+        self.calls.append(kwargs)
+        fields = kwargs.get("_source_includes") or FILM
+        source = {field: FILM[field] for field in fields}
+        return {"_id": id, "_seq_no": 7, "_primary_term": 1, "found": True, "_source": source}
+
+
+def test_film_and_etag_come_from_one_get():
+    elastic = FakeElastic()
+    service = FilmService(film_storage=ElasticStorage(elastic, "movies"))
+
+    film, etag = asyncio.run(service.get_with_etag("film", fields=["id", "title"]))
+
+    assert film == {"id": "film", "title": "Film"}
+    assert etag == 'W/"1-7"'
+    assert len(elastic.calls) == 1
@@ -1,10 +1,17 @@
 from datetime import datetime
 from time import sleep
-from typing import Callable, List
+from typing import Callable, List, Optional
 
-from pydantic import AnyHttpUrl, BaseSettings, PostgresDsn
+from pydantic import AnyHttpUrl, BaseSettings, PostgresDsn, RedisDsn
 from repo import BaseRepository, FilmworkRepository, GenreRepository, PersonRepository
-from storage import ElasticWriter, JsonFileStorage, PGReader, State
+from storage import (
+    ElasticWriter,
+    JsonFileStorage,
+    PGReader,
+    State,
+    TopFilmsWriter,
+    UpdatesPublisher,
+)
 from utils import coroutine, get_logger, load_indexes, logger
 
 from models import Filmwork
@@ -13,6 +20,7 @@ from models import Filmwork
 class Settings(BaseSettings):
     elastic_dsn: AnyHttpUrl
     postgres_dsn: PostgresDsn
+    redis_dsn: Optional[RedisDsn] = None
     local_storage_path: str = "/var/lib/ymp/etl.json"
     chunk_size: int = 100
 
@@ -127,11 +135,24 @@ def main():
     state_storage = State(JsonFileStorage(str(settings.local_storage_path)))
     pg_reader = PGReader(f"{str(settings.postgres_dsn)}/movies")
     elastic_writer = ElasticWriter(str(settings.elastic_dsn))
+    # Публикация обновленных документов для инвалидации кеша в сервисе фильмов
+    updates_publisher = UpdatesPublisher(str(settings.redis_dsn)) if settings.redis_dsn else None
+    # Рейтинги фильмов в redis для первых страниц списка фильмов
+    top_films_writer = TopFilmsWriter(str(settings.redis_dsn)) if settings.redis_dsn else None
 
     # Репозитории моделей для получения и обновления данных
-    genre_repo = GenreRepository(pg_reader=pg_reader, elastic_writer=elastic_writer)
-    person_repo = PersonRepository(pg_reader=pg_reader, elastic_writer=elastic_writer)
-    filmwork_repo = FilmworkRepository(pg_reader=pg_reader, elastic_writer=elastic_writer)
+    genre_repo = GenreRepository(
+        pg_reader=pg_reader, elastic_writer=elastic_writer, updates_publisher=updates_publisher
+    )
+    person_repo = PersonRepository(
+        pg_reader=pg_reader, elastic_writer=elastic_writer, updates_publisher=updates_publisher
+    )
+    filmwork_repo = FilmworkRepository(
+        pg_reader=pg_reader,
+        elastic_writer=elastic_writer,
+        updates_publisher=updates_publisher,
+        top_films_writer=top_films_writer,
+    )
 
     # Etl пайплайны для жанров, персонажей, фильмов
     genre_etl = GenreEtl(repo=genre_repo, chunk_size=settings.chunk_size)
@@ -143,6 +164,10 @@ def main():
     filmwork_pipeline = filmwork_etl.get_pipeline()
 
     def last_timestamp_getter() -> datetime:
+        if top_films_writer is not None and not top_films_writer.is_ready():
+            # Рейтинги фильмов в redis пустые или неполные, загружаем все данные заново
+            return datetime.min
+
         last_timestampt = state_storage.get_state("timestamp")
         if last_timestampt:
             return datetime.fromisoformat(last_timestampt)
@@ -151,6 +176,9 @@ def main():
 
     def last_timestamp_setter(timestamp: datetime):
         state_storage.set_state("timestamp", timestamp.isoformat())
+        if top_films_writer is not None:
+            # Все фильмы прошли через etl хотя бы один раз
+            top_films_writer.set_ready()
 
     # Корутина для запуска процесса ETL
     beat_coro(
@@ -6,6 +6,15 @@ PersonIDType = str
 GenreIDType = str
 
 
+def suggest_inputs(text: str) -> List[str]:
+    """
+    Варианты ввода для completion suggester: текст целиком и текст, начиная с каждого слова,
+    чтобы подсказка находилась по началу любого слова, а не только первого
+    """
+    words = text.split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
 @dataclass
 class FilmworkPerson:
     id: str
@@ -22,7 +31,7 @@ class Person:
     full_name: str
 
     def to_dict(self):
-        return asdict(self)
+        return {**asdict(self), "full_name_suggest": {"input": suggest_inputs(self.full_name)}}
 
 
 @dataclass
@@ -47,4 +56,9 @@ class Filmwork:
     actors: List[Person] = field(default_factory=list)
 
     def to_dict(self):
-        return asdict(self)
+        # Фильмы с более высоким рейтингом поднимаются выше в подсказках
+        title_suggest = {
+            "input": suggest_inputs(self.title),
+            "weight": int((self.imdb_rating or 0) * 10),
+        }
+        return {**asdict(self), "title_suggest": title_suggest}
@@ -2,9 +2,9 @@ from abc import ABC, abstractmethod
 from collections import defaultdict
 from datetime import datetime
 from itertools import chain
-from typing import Any, Dict, Iterator, List, Set
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 
-from storage import ElasticWriter, PGReader
+from storage import ElasticWriter, PGReader, TopFilmsWriter, UpdatesPublisher
 from utils import logger
 
 from models import Filmwork, FilmworkIDType, FilmworkPerson, Genre, Person
@@ -15,9 +15,15 @@ class BaseRepository(ABC):
     Базовый класс для описания запросов к postgres, elastic в рамках конкретной модели данных
     """
 
-    def __init__(self, pg_reader: PGReader, elastic_writer: ElasticWriter):
+    def __init__(
+        self,
+        pg_reader: PGReader,
+        elastic_writer: ElasticWriter,
+        updates_publisher: Optional[UpdatesPublisher] = None,
+    ):
         self.pg_reader = pg_reader
         self.elastic_writer = elastic_writer
+        self.updates_publisher = updates_publisher
 
     @abstractmethod
     def get_modified_items(
@@ -35,6 +41,18 @@ class BaseRepository(ABC):
         """
         pass
 
+    def publish_updated_items(
+        self, index_name: str, result: List[Tuple[str, Optional[str]]]
+    ) -> None:
+        """
+        Публикация id успешно обновленных документов для инвалидации кеша
+        """
+        if self.updates_publisher is None:
+            return
+
+        updated_ids = [str(item_id) for item_id, error in result if not error]
+        self.updates_publisher.publish(index_name=index_name, ids=updated_ids)
+
 
 class GenreRepository(BaseRepository):
     def get_modified_items(
@@ -53,6 +71,7 @@ class GenreRepository(BaseRepository):
             if error:
                 logger.error(f'Update for genre document "{item_id}" got error "{error}".')
 
+        self.publish_updated_items(index_name="genres", result=result)
         return None
 
 
@@ -76,10 +95,21 @@ class PersonRepository(BaseRepository):
             if error:
                 logger.error(f'Update for person document "{item_id}" got error "{error}".')
 
+        self.publish_updated_items(index_name="persons", result=result)
         return None
 
 
 class FilmworkRepository(BaseRepository):
+    def __init__(
+        self,
+        pg_reader: PGReader,
+        elastic_writer: ElasticWriter,
+        updates_publisher: Optional[UpdatesPublisher] = None,
+        top_films_writer: Optional[TopFilmsWriter] = None,
+    ):
+        super().__init__(pg_reader, elastic_writer, updates_publisher)
+        self.top_films_writer = top_films_writer
+
     def get_modified_items(
         self, last_timestamp: datetime, chunk_size: int = 100
     ) -> Iterator[List[Filmwork]]:
@@ -196,4 +226,9 @@ class FilmworkRepository(BaseRepository):
             if error:
                 logger.error(f'Update for movies document "{item_id}" got error "{error}".')
 
+        if self.top_films_writer is not None:
+            updated_ids = {item_id for item_id, error in result if not error}
+            self.top_films_writer.update([i for i in items if i.id in updated_ids])
+
+        self.publish_updated_items(index_name="movies", result=result)
         return None
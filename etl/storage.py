@@ -6,6 +6,7 @@ from pathlib import Path
 from typing import Any, List, Optional, Tuple
 
 import psycopg2
+import redis
 import requests
 from psycopg2 import sql
 from queries import (
@@ -20,7 +21,7 @@ from queries import (
 )
 from utils import backoff
 
-from models import FilmworkIDType, GenreIDType, PersonIDType
+from models import Filmwork, FilmworkIDType, GenreIDType, PersonIDType
 
 
 def is_db_reader_connection_error(e: Exception):
@@ -31,6 +32,10 @@ def is_writer_connection_error(e: Exception):
     return isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
 
 
+def is_publisher_connection_error(e: Exception):
+    return isinstance(e, (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError))
+
+
 class PGReader:
     """
     Класс для чтения данных из postgres
@@ -234,6 +239,94 @@ class ElasticWriter:
         return [(item_id, errors_map.get(item_id)) for item_id, _ in items]
 
 
+class UpdatesPublisher:
+    """
+    Класс для публикации id обновленных документов в redis.
+    Сервис фильмов подписан на канал и удаляет из кеша ответы, зависящие от этих документов.
+    """
+
+    channel = "etl:updated"
+
+    def __init__(self, redis_dsn: str):
+        self.redis = redis.Redis.from_url(redis_dsn)
+
+    @backoff(
+        on_predicate=is_publisher_connection_error,
+        border_sleep_time=60,
+    )
+    def publish(self, index_name: str, ids: List[str]) -> None:
+        if not ids:
+            return
+        self.redis.publish(self.channel, json.dumps({"index": index_name, "ids": ids}))
+
+
+class TopFilmsWriter:
+    """
+    Класс для ведения рейтингов фильмов в sorted set redis: общего и по каждому жанру,
+    и кратких данных фильмов для ответа. Сервис фильмов отдает из них первые страницы
+    списка фильмов по убыванию рейтинга без запроса в elastic.
+
+    Счет фильма - рейтинг со знаком минус, поэтому при обходе по возрастанию счета фильмы
+    с равным рейтингом упорядочены по id, как в сортировке elastic. Фильмы без рейтинга
+    получают счет +inf и идут в конце, как документы без значения поля в elastic.
+    """
+
+    rating_key = "top:films:rating"
+    genre_rating_key = "top:films:rating:genre:{genre_id}"
+    summary_key = "top:films:summary"
+    genres_key = "top:films:genres"
+    # Признак того, что в рейтинги загружены все фильмы
+    ready_key = "top:films:ready"
+
+    def __init__(self, redis_dsn: str):
+        self.redis = redis.Redis.from_url(redis_dsn)
+
+    @backoff(
+        on_predicate=is_publisher_connection_error,
+        border_sleep_time=60,
+    )
+    def is_ready(self) -> bool:
+        return bool(self.redis.exists(self.ready_key))
+
+    @backoff(
+        on_predicate=is_publisher_connection_error,
+        border_sleep_time=60,
+    )
+    def set_ready(self) -> None:
+        self.redis.set(self.ready_key, 1)
+
+    @backoff(
+        on_predicate=is_publisher_connection_error,
+        border_sleep_time=60,
+    )
+    def update(self, filmworks: List[Filmwork]) -> None:
+        if not filmworks:
+            return
+
+        # Жанры фильмов на момент прошлого обновления, чтобы убрать фильм из рейтингов старых жанров
+        previous_genres = self.redis.hmget(self.genres_key, [f.id for f in filmworks])
+
+        pipeline = self.redis.pipeline()
+        for filmwork, previous in zip(filmworks, previous_genres):
+            genre_ids = [genre.id for genre in filmwork.genres]
+            for genre_id in set(json.loads(previous) if previous else []) - set(genre_ids):
+                pipeline.zrem(self.genre_rating_key.format(genre_id=genre_id), filmwork.id)
+
+            score = -filmwork.imdb_rating if filmwork.imdb_rating is not None else float("inf")
+            pipeline.zadd(self.rating_key, {filmwork.id: score})
+            for genre_id in genre_ids:
+                pipeline.zadd(self.genre_rating_key.format(genre_id=genre_id), {filmwork.id: score})
+
+            summary = {
+                "id": filmwork.id,
+                "title": filmwork.title,
+                "imdb_rating": filmwork.imdb_rating,
+            }
+            pipeline.hset(self.summary_key, filmwork.id, json.dumps(summary))
+            pipeline.hset(self.genres_key, filmwork.id, json.dumps(genre_ids))
+        pipeline.execute()
+
+
 class BaseStorage:
     @abc.abstractmethod
     def save_state(self, state: dict) -> None:
@@ -82,11 +82,23 @@ def backoff(
 def load_indexes(es_dsn: str):
     """Функция для загрузки индексов в elastic"""
 
+    def check_response(response):
+        # Конфликт маппинга нельзя пропускать: etl продолжил бы писать в индекс со старым маппингом
+        if not response.ok:
+            logger.error(
+                f'{response.request.method} "{response.url}" failed '
+                f'with status {response.status_code}: {response.text}'
+            )
+            response.raise_for_status()
+
     @backoff(lambda exc: isinstance(exc, (ConnectionError, ConnectTimeout)))
     def create_if_not_exist(url, data):
         response = requests.head(url=url)
         if response.status_code == 404:
-            requests.put(url=url, json=data)
+            check_response(requests.put(url=url, json=data))
+        else:
+            # Новые поля добавляются в маппинг существующего индекса
+            check_response(requests.put(url=f"{url}/_mapping", json=data["mappings"]))
 
     indexes = os.listdir("indexes")
     for index in indexes: